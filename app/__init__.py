@@ -5,6 +5,7 @@ Flask application factory для створення екземплярів до
 """
 
 from flask import Flask, jsonify, request, flash, redirect, url_for
+from sqlalchemy import text
 
 
 def create_app(config_class=None):
@@ -27,6 +28,13 @@ def create_app(config_class=None):
         config_class = Config
     app.config.from_object(config_class)
 
+    # Байткод скомпільованих Jinja-шаблонів на диску: холодний воркер
+    # (рестарт gunicorn) не парсить dashboard.html та ін. з сирців заново.
+    # Стрімінг шаблонів свідомо не вмикаємо — base.html читає flash-повідомлення
+    # із сесії, а при стрімінгу сесія зберігається раніше, ніж рендериться тіло
+    from jinja2 import FileSystemBytecodeCache
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
     # Initialize extensions
     from app.extensions import init_extensions, login_manager, db
     init_extensions(app)
@@ -77,16 +85,43 @@ def create_app(config_class=None):
     @app.route('/health')
     def health():
         try:
-            from sqlalchemy import text
             db.session.execute(text('SELECT 1'))
             return jsonify({'status': 'ok'}), 200
         except Exception:
             return jsonify({'status': 'error', 'detail': 'database unreachable'}), 503
 
+    # Лічильник SQL-запитів на HTTP-запит — сторож від N+1-регресій.
+    # Перевищення SQL_QUERY_BUDGET пишеться в лог (у тестах/debug — помилка)
+    from flask import g, has_request_context
+    from sqlalchemy import event
+
+    def _count_sql_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.sql_query_count = g.get('sql_query_count', 0) + 1
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _count_sql_query)
+
+    @app.before_request
+    def reset_sql_query_count():
+        g.sql_query_count = 0
+
+    @app.after_request
+    def check_sql_query_budget(response):
+        budget = app.config.get('SQL_QUERY_BUDGET')
+        count = g.get('sql_query_count', 0)
+        if budget and count > budget:
+            message = f'{request.endpoint}: {count} SQL queries (budget {budget})'
+            if app.debug or app.testing:
+                raise RuntimeError(message)
+            app.logger.warning(message)
+        return response
+
     # CLI commands for database management
     import click
     from models import log_action
     from constants import VALID_ROLES
+    from utils import username_exists
 
     @app.cli.command('init-db')
     def init_db():
@@ -105,7 +140,7 @@ def create_app(config_class=None):
         if len(password) < 8:
             click.echo('Error: Password must be at least 8 characters.')
             return
-        if User.query.filter_by(username=username).first():
+        if username_exists(username):
             click.echo('User already exists.')
             return
         u = User(username=username, role='admin')
@@ -126,7 +161,7 @@ def create_app(config_class=None):
         if len(password) < 8:
             click.echo('Error: Password must be at least 8 characters.')
             return
-        if User.query.filter_by(username=username).first():
+        if username_exists(username):
             click.echo('User already exists.')
             return
         u = User(username=username, role=role.lower())
@@ -199,7 +234,7 @@ def create_app(config_class=None):
             return
         db.create_all()
         seed_status_options()
-        if not User.query.filter_by(username=username).first():
+        if not username_exists(username):
             u = User(username=username, role='admin')
             u.set_password(password)
             db.session.add(u)
@@ -7,13 +7,15 @@ from flask import render_template, redirect, url_for, flash, request, current_ap
 from flask_login import login_required, current_user
 from datetime import datetime, date, timedelta
 from io import BytesIO
-from sqlalchemy import extract, case, func
+from sqlalchemy import extract, case, exists, func, insert, select
+from sqlalchemy.exc import IntegrityError
 
 from app.extensions import db
 from models import User, Department, Audit, Record, AmbulatoryRecord, NSZUCorrection, StatusOption, log_action
 from decorators import role_required
-from utils import clear_dropdown_cache, escape_like
-from constants import VALID_ROLES, STATUS_DISCHARGED, STATUS_PROCESSING, STATUS_VIOLATIONS, UKRAINIAN_MONTHS
+from utils import (clear_department_cache, clear_dropdown_cache, clear_user_map_cache, escape_like, get_user_map,
+                   month_bounds, username_exists)
+from constants import KYIV_TZ, VALID_ROLES, STATUS_DISCHARGED, STATUS_PROCESSING, STATUS_VIOLATIONS, UKRAINIAN_MONTHS
 from . import admin_bp
 
 
@@ -21,7 +23,10 @@ from . import admin_bp
 @admin_bp.route('/users')
 @role_required('admin')
 def admin_users():
-    users = User.query.order_by(User.username).all()
+    # Лише колонки для таблиці — без ORM-об'єктів і password_hash
+    users = db.session.execute(
+        select(User.id, User.username, User.role).order_by(User.username)
+    ).all()
     return render_template('admin_users.html', users=users)
 
 
@@ -42,16 +47,22 @@ def admin_create_user():
     if len(password) < 8:
         flash('Пароль повинен містити щонайменше 8 символів', 'warning')
         return redirect(url_for('admin.admin_users'))
-    if User.query.filter_by(username=username).first():
+
+    # Core INSERT замість User() + flush: id повертає сам INSERT. Унікальність
+    # username перевіряє UNIQUE-індекс — без окремого SELECT EXISTS наперед
+    try:
+        user_id = db.session.execute(insert(User).values(
+            username=username,
+            role=role,
+            password_hash=User.hash_password(password),
+        )).inserted_primary_key[0]
+    except IntegrityError:
+        db.session.rollback()
         flash('Ім\'я користувача вже зайнято', 'warning')
         return redirect(url_for('admin.admin_users'))
-
-    u = User(username=username, role=role)
-    u.set_password(password)
-    db.session.add(u)
-    db.session.flush()  # assigns u.id
-    log_action(current_user.id, 'user.create', 'user', u.id, f'role={role}')
+    log_action(current_user.id, 'user.create', 'user', user_id, f'role={role}')
     db.session.commit()
+    clear_user_map_cache()
     current_app.logger.info(f'User created: {username} by {current_user.username}')
     flash(f'Користувача {username} ({role}) успішно створено', 'success')
     return redirect(url_for('admin.admin_users'))
@@ -72,8 +83,7 @@ def admin_edit_user(user_id):
             return redirect(url_for('admin.admin_edit_user', user_id=user_id))
 
         # Check if username is taken by another user
-        existing = User.query.filter_by(username=username).first()
-        if existing and existing.id != user_id:
+        if username_exists(username, exclude_id=user_id):
             flash('Ім\'я користувача вже зайнято', 'warning')
             return redirect(url_for('admin.admin_edit_user', user_id=user_id))
 
@@ -104,6 +114,8 @@ def admin_edit_user(user_id):
             current_app.logger.exception('Failed to update user')
             flash('Помилка при збереженні змін', 'danger')
             return redirect(url_for('admin.admin_edit_user', user_id=user_id))
+        # Нове ім'я одразу в колонках «Створив/Змінив», а не через 5 хв TTL
+        clear_user_map_cache()
         current_app.logger.info(f'User updated: {u.username} by {current_user.username}')
         flash(f'Користувача {u.username} успішно оновлено', 'success')
         return redirect(url_for('admin.admin_users'))
@@ -129,6 +141,7 @@ def admin_delete_user(user_id):
         current_app.logger.exception('Failed to delete user')
         flash('Помилка при видаленні користувача', 'danger')
         return redirect(url_for('admin.admin_users'))
+    clear_user_map_cache()
     current_app.logger.info(f'User deleted: {saved_username} by {current_user.username}')
     flash(f'Користувача {saved_username} видалено', 'danger')
     return redirect(url_for('admin.admin_users'))
@@ -159,6 +172,7 @@ def admin_create_department():
     db.session.commit()
     # Clear dropdown cache after creating department
     clear_dropdown_cache()
+    clear_department_cache()
     current_app.logger.info(f'Department created: {name} by {current_user.username}')
     flash(f'Відділення "{name}" успішно створено', 'success')
     return redirect(url_for('admin.admin_departments'))
@@ -169,9 +183,11 @@ def admin_create_department():
 def admin_delete_department(dept_id):
     d = db.get_or_404(Department, dept_id)
     # prevent deletion if department in use
-    in_use = Record.query.filter(Record.discharge_department == d.name).count()
+    # EXISTS зупиняється на першому збігу idx_record_discharge_department —
+    # COUNT(*) обходив усі записи відділення лише заради «не нуль»
+    in_use = db.session.query(exists().where(Record.discharge_department == d.name)).scalar()
     if in_use:
-        flash(f'Неможливо видалити відділення "{d.name}" - використовується в {in_use} записах', 'danger')
+        flash(f'Неможливо видалити відділення "{d.name}" - використовується в записах', 'danger')
         return redirect(url_for('admin.admin_departments'))
     saved_id = d.id
     saved_name = d.name
@@ -180,6 +196,7 @@ def admin_delete_department(dept_id):
     db.session.commit()
     # Clear dropdown cache after deleting department
     clear_dropdown_cache()
+    clear_department_cache()
     current_app.logger.info(f'Department deleted: {saved_name} by {current_user.username}')
     flash(f'Відділення "{saved_name}" видалено', 'danger')
     return redirect(url_for('admin.admin_departments'))
@@ -252,7 +269,7 @@ def admin_create_status():
     db.session.flush()
     log_action(current_user.id, 'status.create', 'status_option', s.id, f'scope={scope}, name={name}')
     db.session.commit()
-    clear_dropdown_cache()
+    clear_dropdown_cache(full=True)
     current_app.logger.info(f'StatusOption created: [{scope}] {name} by {current_user.username}')
     flash(f'Статус «{name}» успішно створено', 'success')
     return redirect(url_for('admin.admin_statuses', scope=scope))
@@ -310,7 +327,7 @@ def admin_update_status(status_id):
         flash('Помилка при збереженні статусу', 'danger')
         return redirect(url_for('admin.admin_statuses', scope=s.scope))
 
-    clear_dropdown_cache()
+    clear_dropdown_cache(full=True)
     current_app.logger.info(f'StatusOption updated: [{s.scope}] {old_name}->{new_name} by {current_user.username}')
     if renamed and renamed_count:
         flash(f'Статус «{old_name}» перейменовано на «{new_name}», оновлено записів: {renamed_count}', 'success')
@@ -330,7 +347,7 @@ def admin_set_default_status(status_id):
     s.is_default = True
     log_action(current_user.id, 'status.set_default', 'status_option', s.id, f'scope={s.scope}, name={s.name}')
     db.session.commit()
-    clear_dropdown_cache()
+    clear_dropdown_cache(full=True)
     flash(f'Статус «{s.name}» встановлено за замовчуванням для нових записів', 'success')
     return redirect(url_for('admin.admin_statuses', scope=s.scope))
 
@@ -349,7 +366,7 @@ def admin_toggle_status(status_id):
     action = 'status.activate' if s.is_active else 'status.deactivate'
     log_action(current_user.id, action, 'status_option', s.id, f'scope={s.scope}, name={s.name}')
     db.session.commit()
-    clear_dropdown_cache()
+    clear_dropdown_cache(full=True)
     state = 'активовано' if s.is_active else 'деактивовано'
     flash(f'Статус «{s.name}» {state}', 'success')
     return redirect(url_for('admin.admin_statuses', scope=s.scope))
@@ -363,9 +380,9 @@ def admin_delete_status(status_id):
         flash(f'Статус «{s.name}» — системний, його не можна видалити', 'warning')
         return redirect(url_for('admin.admin_statuses', scope=s.scope))
     col = _scope_status_column(s.scope)
-    in_use = STATUS_SCOPES[s.scope]['model'].query.filter(col == s.name).count()
+    in_use = db.session.query(exists().where(col == s.name)).scalar()
     if in_use:
-        flash(f'Неможливо видалити статус «{s.name}» — використовується в {in_use} записах. Деактивуйте його натомість.', 'danger')
+        flash(f'Неможливо видалити статус «{s.name}» — використовується в записах. Деактивуйте його натомість.', 'danger')
         return redirect(url_for('admin.admin_statuses', scope=s.scope))
     if s.is_default:
         flash('Статус за замовчуванням не можна видалити — спочатку призначте інший', 'warning')
@@ -374,7 +391,7 @@ def admin_delete_status(status_id):
     db.session.delete(s)
     log_action(current_user.id, 'status.delete', 'status_option', saved_id, f'scope={saved_scope}, name={saved_name}')
     db.session.commit()
-    clear_dropdown_cache()
+    clear_dropdown_cache(full=True)
     current_app.logger.info(f'StatusOption deleted: [{saved_scope}] {saved_name} by {current_user.username}')
     flash(f'Статус «{saved_name}» видалено', 'danger')
     return redirect(url_for('admin.admin_statuses', scope=saved_scope))
@@ -416,7 +433,7 @@ def admin_statistics():
             y, m = int(y), int(m)
             if 1 <= m <= 12 and 2000 <= y <= 2100:
                 from_date = date(y, m, 1)
-                to_date = date(y + 1, 1, 1) - timedelta(days=1) if m == 12 else date(y, m + 1, 1) - timedelta(days=1)
+                to_date = month_bounds(y, m)[1] - timedelta(days=1)
         except (ValueError, IndexError):
             pass
 
@@ -424,10 +441,7 @@ def admin_statistics():
     if from_date is None:
         from_date = date(today.year, today.month, 1)
     if to_date is None:
-        if from_date.month == 12:
-            to_date = date(from_date.year + 1, 1, 1) - timedelta(days=1)
-        else:
-            to_date = date(from_date.year, from_date.month + 1, 1) - timedelta(days=1)
+        to_date = month_bounds(from_date.year, from_date.month)[1] - timedelta(days=1)
 
     # Validate: from <= to
     if from_date > to_date:
@@ -458,7 +472,7 @@ def admin_statistics():
     max_per_day = max((r.count for r in per_day_rows), default=0)
     records_per_day = []
     for r in per_day_rows:
-        d = r.date if not isinstance(r.date, str) else datetime.strptime(r.date, '%Y-%m-%d').date()
+        d = r.date if not isinstance(r.date, str) else date.fromisoformat(r.date)
         records_per_day.append({'date': d.strftime('%d.%m.%Y'), 'count': r.count})
 
     # 2. Status distribution by department (OPTIMIZED: Single GROUP BY query)
@@ -605,10 +619,7 @@ def _parse_report_dates():
     if from_date is None:
         from_date = date(today.year, today.month, 1)
     if to_date is None:
-        if from_date.month == 12:
-            to_date = date(from_date.year + 1, 1, 1) - timedelta(days=1)
-        else:
-            to_date = date(from_date.year, from_date.month + 1, 1) - timedelta(days=1)
+        to_date = month_bounds(from_date.year, from_date.month)[1] - timedelta(days=1)
     if from_date > to_date:
         from_date, to_date = to_date, from_date
     query_end = to_date + timedelta(days=1)
@@ -741,9 +752,6 @@ def report_submission():
         func.sum(case((Record.history_submitted == False, 1), else_=0)).desc()
     ).all()
 
-    import datetime as _dt
-    kyiv_tz = _dt.timezone(_dt.timedelta(hours=2))
-
     try:
         from weasyprint import HTML
     except ImportError:
@@ -759,7 +767,7 @@ def report_submission():
         submission_not_submitted=submission_row.not_submitted or 0,
         submission_by_physician=submission_by_physician,
         generated_by=current_user.username,
-        generated_at=datetime.now(kyiv_tz),
+        generated_at=datetime.now(KYIV_TZ),
     )
     pdf = HTML(string=html_string).write_pdf()
     bio = BytesIO(pdf)
@@ -807,9 +815,6 @@ def report_urgency():
         func.sum(case((Record.is_urgent == True, 1), else_=0)).desc()
     ).all()
 
-    import datetime as _dt
-    kyiv_tz = _dt.timezone(_dt.timedelta(hours=2))
-
     try:
         from weasyprint import HTML
     except ImportError:
@@ -826,7 +831,7 @@ def report_urgency():
         urgency_unset=urgency_row.unset or 0,
         urgency_by_dept=urgency_by_dept,
         generated_by=current_user.username,
-        generated_at=datetime.now(kyiv_tz),
+        generated_at=datetime.now(KYIV_TZ),
     )
     pdf = HTML(string=html_string).write_pdf()
     bio = BytesIO(pdf)
@@ -847,8 +852,6 @@ def report_urgency():
 @role_required('admin')
 def admin_audit():
     """View audit log with filters and pagination."""
-    from utils import get_user_map
-
     # Filters
     action_filter = request.args.get('action', '').strip()
     actor_filter = request.args.get('actor', '').strip()
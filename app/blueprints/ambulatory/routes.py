@@ -5,26 +5,29 @@ Ambulatory routes - handles CRUD operations, filters, Excel exports, and PDF gen
 
 from flask import render_template, redirect, url_for, flash, request, current_app, send_file, jsonify
 from flask_login import login_required, current_user
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 from io import BytesIO
-from sqlalchemy.orm import joinedload
-from sqlalchemy import func
+from sqlalchemy import case, func
 
 from app.extensions import db
 from models import AmbulatoryRecord, User, log_action
 from decorators import role_required
 from utils import (parse_date, clear_dropdown_cache, get_user_map, escape_like,
                    validate_ambulatory_form, get_ambulatory_statuses,
-                   get_default_ambulatory_status, get_distinct_ambulatory_doctors)
+                   get_default_ambulatory_status, get_distinct_ambulatory_doctors, month_bounds,
+                   preserved_filters, build_xlsx, xlsx_file, send_xlsx)
+from constants import KYIV_TZ
 from . import ambulatory_bp
 
+# Фільтри списку, що зберігаються після додавання/редагування/видалення
+_FILTER_KEYS = ('discharge_status', 'doctor', 'full_name', 'journal_number', 'diagnosis')
+
 
 @ambulatory_bp.route('/')
 @login_required
 def index():
     # Use Kyiv timezone (UTC+2, or UTC+3 during DST)
-    kyiv_tz = timezone(timedelta(hours=2))
-    now = datetime.now(kyiv_tz)
+    now = datetime.now(KYIV_TZ)
 
     # Toggle to show all months
     show_all = request.args.get('all_months', '').lower() in ('1', 'true', 'yes')
@@ -33,61 +36,38 @@ def index():
     month_input = request.args.get('month_filter', '').strip()
     from_date_input = request.args.get('from_date', '').strip()
     to_date_input = request.args.get('to_date', '').strip()
-    selected_month = None
-    selected_year = None
+
+    # Default to current month; [start, end) — end exclusive
+    selected_year, selected_month = now.year, now.month
+    start, end = month_bounds(now.year, now.month)
 
     try:
         if from_date_input and to_date_input:
             # Date range mode
-            from datetime import date as date_type
-            fd = date_type.fromisoformat(from_date_input)
-            td = date_type.fromisoformat(to_date_input)
+            fd = date.fromisoformat(from_date_input)
+            td = date.fromisoformat(to_date_input)
             if fd > td:
                 fd, td = td, fd
-            start = datetime(fd.year, fd.month, fd.day)
-            end = datetime(td.year, td.month, td.day) + timedelta(days=1)
-            selected_year = fd.year
-            selected_month = fd.month
+            start, end = fd, td + timedelta(days=1)
+            selected_year, selected_month = fd.year, fd.month
         elif month_input:
-            parts = month_input.split('-')
-            if len(parts) == 2:
-                selected_year = int(parts[0])
-                selected_month = int(parts[1])
-                if 1 <= selected_month <= 12:
-                    start = datetime(selected_year, selected_month, 1)
-                    if selected_month == 12:
-                        end = datetime(selected_year + 1, 1, 1)
-                    else:
-                        end = datetime(selected_year, selected_month + 1, 1)
-                else:
-                    raise ValueError()
-            else:
-                raise ValueError()
-        else:
-            # Default to current month
-            start = datetime(now.year, now.month, 1)
-            selected_year = now.year
-            selected_month = now.month
-            if now.month == 12:
-                end = datetime(now.year + 1, 1, 1)
-            else:
-                end = datetime(now.year, now.month + 1, 1)
+            year_str, month_str = month_input.split('-')
+            year, month = int(year_str), int(month_str)
+            start, end = month_bounds(year, month)
+            selected_year, selected_month = year, month
     except Exception:
-        start = datetime(now.year, now.month, 1)
-        selected_year = now.year
-        selected_month = now.month
-        if now.month == 12:
-            end = datetime(now.year + 1, 1, 1)
-        else:
-            end = datetime(now.year, now.month + 1, 1)
+        # invalid input — fall back to current month (already set above)
+        pass
 
     # Base query
-    q = AmbulatoryRecord.query.options(joinedload(AmbulatoryRecord.creator), joinedload(AmbulatoryRecord.updater))
+    # Без eager-load creator/updater: ambulatory_list.html бере імена з user_map,
+    # а два LEFT JOIN на users лише роздували кожен рядок
+    q = AmbulatoryRecord.query
     date_conditions = []
     if not show_all:
         date_conditions = [
-            AmbulatoryRecord.date >= start.date(),
-            AmbulatoryRecord.date < end.date(),
+            AmbulatoryRecord.date >= start,
+            AmbulatoryRecord.date < end,
         ]
         q = q.filter(*date_conditions)
 
@@ -149,15 +129,19 @@ def index():
             else:
                 q = q.order_by(col.desc())
 
-    # Stats calculations: один GROUP BY замість окремого count() на статус
-    count = q.count()
-    counts_q = db.session.query(AmbulatoryRecord.discharge_status, func.count(AmbulatoryRecord.id))
+    # Stats calculations: один GROUP BY замість окремого count() на статус.
+    # Ургентні рахуються в тих самих групах, а сума груп — це загальна кількість,
+    # тож ні окремий COUNT ургентних, ні COUNT у paginate() не потрібні
+    counts_q = db.session.query(AmbulatoryRecord.discharge_status, func.count(AmbulatoryRecord.id),
+                                func.count(case((AmbulatoryRecord.is_urgent == True, 1))))
     if date_conditions:
         counts_q = counts_q.filter(*date_conditions)
     if conditions:
         counts_q = counts_q.filter(*conditions)
-    status_counts = {name: cnt for name, cnt in counts_q.group_by(AmbulatoryRecord.discharge_status).all() if name}
-    count_urgent = q.filter(AmbulatoryRecord.is_urgent == True).count()
+    groups = counts_q.group_by(AmbulatoryRecord.discharge_status).all()
+    status_counts = {name: cnt for name, cnt, _ in groups if name}
+    count = sum(cnt for _, cnt, _ in groups)
+    count_urgent = sum(urgent for _, _, urgent in groups)
     # Записи зі статусами поза довідником (перейменовані повз bulk-update тощо)
     other_count = sum(cnt for name, cnt in status_counts.items() if name not in status_meta)
 
@@ -166,7 +150,9 @@ def index():
     per_page = request.args.get('per_page', 100, type=int)
     per_page = max(10, min(per_page, 200))
 
-    pagination = q.paginate(page=page, per_page=per_page, error_out=False)
+    # total уже пораховано з GROUP BY вище — paginate() не робить власний COUNT
+    pagination = q.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagination.total = count
     records = pagination.items
 
     user_map = get_user_map()
@@ -210,9 +196,6 @@ def index():
 @role_required('editor', 'viewer')
 def export():
     """Export ambulatory records to Excel based on date filters."""
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    from openpyxl.utils import get_column_letter
 
     export_mode = request.form.get('export_mode', 'month').strip()
 
@@ -223,8 +206,8 @@ def export():
             flash('Будь ласка, вкажіть обидві дати для експорту', 'warning')
             return redirect(url_for('ambulatory.index'))
         try:
-            from_d = datetime.strptime(from_str, '%Y-%m-%d').date()
-            to_d = datetime.strptime(to_str, '%Y-%m-%d').date()
+            from_d = date.fromisoformat(from_str)
+            to_d = date.fromisoformat(to_str)
         except ValueError:
             flash('Невірний формат дати', 'warning')
             return redirect(url_for('ambulatory.index'))
@@ -241,19 +224,9 @@ def export():
             flash('Будь ласка, вкажіть місяць для експорту', 'warning')
             return redirect(url_for('ambulatory.index'))
         try:
-            parts = month_input.split('-')
-            if len(parts) != 2:
-                raise ValueError()
-            year = int(parts[0])
-            month = int(parts[1])
-            if not (1 <= month <= 12):
-                raise ValueError()
-            from_d = datetime(year, month, 1).date()
-            if month == 12:
-                to_d = datetime(year + 1, 1, 1).date()
-            else:
-                to_d = datetime(year, month + 1, 1).date()
-            to_d = to_d - timedelta(days=1)
+            year_str, month_str = month_input.split('-')
+            from_d, next_month = month_bounds(int(year_str), int(month_str))
+            to_d = next_month - timedelta(days=1)
             conditions = [
                 AmbulatoryRecord.date >= from_d,
                 AmbulatoryRecord.date <= to_d,
@@ -281,15 +254,6 @@ def export():
         conditions.append(AmbulatoryRecord.diagnosis.ilike(f'%{escape_like(diagnosis_q)}%', escape='\\'))
 
     q = AmbulatoryRecord.query.filter(*conditions)
-    records = q.order_by(AmbulatoryRecord.date.desc()).all()
-
-    if not records:
-        flash('Записів не знайдено для експорту', 'warning')
-        return redirect(url_for('ambulatory.index'))
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Амбулаторна допомога'
 
     headers = [
         'ID', 'Номер у журналі', 'Дата', 'П.І.П (повністю)', 'Дата народження',
@@ -297,21 +261,17 @@ def export():
         'Створено', 'Оновлено', 'Автор', 'Редактор'
     ]
 
-    ws.append(headers)
-
-    # Style header row
-    header_fill = PatternFill(start_color='1f4e78', end_color='1f4e78', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-
     user_map = get_user_map()
 
-    # Data rows
-    for r in records:
-        row = [
+    # Data rows: Row-кортежі лише з потрібних колонок (без ORM-гідратації),
+    # пачками по 1000 через yield_per; генератор — рядки одразу йдуть у build_xlsx
+    columns = (AmbulatoryRecord.id, AmbulatoryRecord.journal_number, AmbulatoryRecord.date,
+               AmbulatoryRecord.full_name, AmbulatoryRecord.birth_date, AmbulatoryRecord.doctor,
+               AmbulatoryRecord.diagnosis, AmbulatoryRecord.discharge_status, AmbulatoryRecord.comment,
+               AmbulatoryRecord.created_at, AmbulatoryRecord.updated_at,
+               AmbulatoryRecord.created_by, AmbulatoryRecord.updated_by)
+    rows = (
+        [
             r.id,
             r.journal_number,
             r.date.strftime('%d.%m.%Y') if r.date else '',
@@ -326,33 +286,24 @@ def export():
             user_map.get(r.created_by, ''),
             user_map.get(r.updated_by, '')
         ]
-        ws.append(row)
-
-    # Auto-size columns
-    for i, col in enumerate(ws.columns, 1):
-        max_length = 0
-        column = get_column_letter(i)
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except Exception:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column].width = adjusted_width
-
-    # Save to BytesIO
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
+        for r in q.with_entities(*columns).order_by(AmbulatoryRecord.date.desc()).yield_per(1000)
+    )
+
+    wb, count = build_xlsx('Амбулаторна допомога', headers, rows, header_color='1f4e78')
+
+    if not count:
+        flash('Записів не знайдено для експорту', 'warning')
+        return redirect(url_for('ambulatory.index'))
+
+    bio = xlsx_file(wb)
 
     # Generate filename
     if export_mode == 'range':
         filename = f"ambulatory_export_{from_d.strftime('%d-%m-%Y')}_{to_d.strftime('%d-%m-%Y')}.xlsx"
-        log_details = f'from={from_d} to={to_d} status={discharge_status} count={len(records)}'
+        log_details = f'from={from_d} to={to_d} status={discharge_status} count={count}'
     else:
         filename = f"ambulatory_export_{from_d.strftime('%m-%Y')}.xlsx"
-        log_details = f'month={from_d.strftime("%m-%Y")} status={discharge_status} count={len(records)}'
+        log_details = f'month={from_d.strftime("%m-%Y")} status={discharge_status} count={count}'
 
     try:
         log_action(current_user.id, 'ambulatory.export', 'ambulatory_record', None, log_details)
@@ -360,7 +311,7 @@ def export():
     except Exception:
         current_app.logger.exception('Failed to write audit log for ambulatory export')
 
-    return send_file(bio, as_attachment=True, download_name=filename, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return send_xlsx(bio, filename)
 
 
 @ambulatory_bp.route('/print', methods=['POST'])
@@ -373,8 +324,8 @@ def print_records():
         if not from_str or not to_str:
             flash('Будь ласка, вкажіть обидві дати для друку', 'warning')
             return redirect(url_for('ambulatory.index'))
-        from_d = datetime.strptime(from_str, '%Y-%m-%d').date()
-        to_d = datetime.strptime(to_str, '%Y-%m-%d').date()
+        from_d = date.fromisoformat(from_str)
+        to_d = date.fromisoformat(to_str)
     except ValueError:
         flash('Невірний формат дати', 'warning')
         return redirect(url_for('ambulatory.index'))
@@ -424,7 +375,7 @@ def print_records():
                                  doctor=doctor,
                                  user_map=user_map,
                                  generated_by=current_user.username,
-                                 generated_at=datetime.now(timezone(timedelta(hours=2))))
+                                 generated_at=datetime.now(KYIV_TZ))
 
     try:
         from weasyprint import HTML
@@ -452,7 +403,9 @@ def print_records():
 @role_required('operator', 'ambulatory')
 def add_record():
     if request.method == 'POST':
-        data, error = validate_ambulatory_form(request.form)
+        # Поля форми — один раз у звичайний dict замість MultiDict-пошуків
+        form = request.form.to_dict()
+        data, error = validate_ambulatory_form(form)
         if error:
             flash(error, 'warning')
             return redirect(url_for('ambulatory.add_record'))
@@ -480,11 +433,7 @@ def add_record():
         current_app.logger.info(f'AmbulatoryRecord created: {r.id} by {current_user.username}')
         flash(f'Запис "{r.full_name}" успішно додано', 'success')
 
-        params = {}
-        for k in ('discharge_status', 'doctor', 'full_name', 'journal_number', 'diagnosis'):
-            v = request.form.get(f'filter_{k}', '').strip()
-            if v:
-                params[k] = v
+        params = preserved_filters(form, _FILTER_KEYS, 'filter_')
         return redirect(url_for('ambulatory.index', **params))
 
     doctors = get_distinct_ambulatory_doctors()
@@ -546,7 +495,8 @@ def edit_record(record_id):
     r = db.get_or_404(AmbulatoryRecord, record_id)
 
     if request.method == 'POST':
-        data, error = validate_ambulatory_form(request.form, require_status=True)
+        form = request.form.to_dict()
+        data, error = validate_ambulatory_form(form, require_status=True)
         if error:
             flash(error, 'warning')
             return redirect(url_for('ambulatory.edit_record', record_id=record_id))
@@ -576,11 +526,7 @@ def edit_record(record_id):
         current_app.logger.info(f'AmbulatoryRecord updated: {r.id} by {current_user.username}')
         flash(f'Запис #{r.id} ({r.full_name}) успішно оновлено', 'success')
 
-        params = {}
-        for k in ('discharge_status', 'doctor', 'full_name', 'journal_number', 'diagnosis'):
-            v = request.form.get(f'filter_{k}', '').strip()
-            if v:
-                params[k] = v
+        params = preserved_filters(form, _FILTER_KEYS, 'filter_')
         return redirect(url_for('ambulatory.index', **params, _anchor=f'record-{r.id}'))
 
     doctors = get_distinct_ambulatory_doctors()
@@ -651,9 +597,5 @@ def delete_record(record_id):
     current_app.logger.info(f'AmbulatoryRecord deleted: {saved_id} by {current_user.username}')
     flash(f'Запис #{saved_id} ({saved_name}) видалено', 'danger')
 
-    params = {}
-    for k in ('discharge_status', 'doctor', 'full_name', 'journal_number', 'diagnosis'):
-        v = request.form.get(k, '').strip()
-        if v:
-            params[k] = v
+    params = preserved_filters(request.form, _FILTER_KEYS)
     return redirect(url_for('ambulatory.index', **params))
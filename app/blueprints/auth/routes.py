@@ -3,16 +3,38 @@
 Authentication routes
 """
 
+from functools import lru_cache
+
 from flask import render_template, redirect, url_for, flash, request, session
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy import lambda_stmt, select
 
 from app.extensions import db, limiter, bcrypt
 from models import User, log_action
 from utils import safe_referrer
 from . import auth_bp
 
-# Pre-computed dummy hash for timing-safe login (prevents username enumeration)
-_DUMMY_HASH = bcrypt.generate_password_hash('dummy-timing-placeholder').decode('utf-8')
+
+@lru_cache(maxsize=1)
+def _dummy_hash():
+    """Dummy hash for timing-safe login (prevents username enumeration).
+
+    Built lazily on the first failed lookup rather than at import time, so it
+    uses the app's configured bcrypt rounds (same cost as real user hashes)
+    and importing the blueprint doesn't pay for a bcrypt round.
+    """
+    return bcrypt.generate_password_hash('dummy-timing-placeholder').decode('utf-8')
+
+
+def _user_by_username(username):
+    """Look up a user for login.
+
+    lambda_stmt caches the compiled SELECT across requests; username is
+    picked up from the closure as a bound parameter.
+    """
+    return db.session.execute(
+        lambda_stmt(lambda: select(User).where(User.username == username))
+    ).scalar_one_or_none()
 
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
@@ -28,14 +50,21 @@ def login():
         return redirect(url_for('records.index'))
 
     if request.method == 'POST':
-        username = request.form.get('username')
+        username = request.form.get('username', '')
         password = request.form.get('password')
-        user = User.query.filter_by(username=username).first()
+        user = _user_by_username(username)
 
         if user is None:
             # Perform dummy hash check to equalize timing (prevents username enumeration)
-            bcrypt.check_password_hash(_DUMMY_HASH, password)
+            bcrypt.check_password_hash(_dummy_hash(), password)
         elif user.check_password(password):
+            # Хеш зі старою (меншою) вартістю — перехешуємо, поки маємо пароль
+            if user.password_needs_rehash():
+                user.set_password(password)
+                try:
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
             session.permanent = True
             login_user(user)
             return redirect(url_for('records.index'))
@@ -5,16 +5,18 @@ NSZU Corrections routes
 
 from flask import render_template, redirect, url_for, flash, request, current_app, send_file, jsonify
 from flask_login import login_required, current_user
-from datetime import datetime, timezone, timedelta
-from calendar import monthrange
+from datetime import date, datetime, timezone, timedelta
 from io import BytesIO
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 
 from app.extensions import db
 from models import NSZUCorrection, User, log_action
 from decorators import role_required
 from utils import (parse_date, parse_numeric, get_user_map, escape_like,
-                   get_status_options, get_default_status)
-from constants import NSZU_STATUSES, UKRAINIAN_MONTHS
+                   get_status_options, get_default_status, month_bounds,
+                   build_xlsx, xlsx_file, send_xlsx)
+from constants import KYIV_TZ, NSZU_STATUSES, UKRAINIAN_MONTHS
 from . import nszu_bp
 
 
@@ -29,7 +31,8 @@ def _valid_nszu_statuses():
 @role_required('editor', 'viewer')
 def nszu_list():
     """List all NSZU corrections with filters"""
-    q = NSZUCorrection.query
+    # nszu_list.html показує c.updater/c.creator — підвантажуємо одним IN-запитом
+    q = NSZUCorrection.query.options(selectinload(NSZUCorrection.creator), selectinload(NSZUCorrection.updater))
 
     # Month filter - default to current month
     month_year_str = request.args.get('month_year', '').strip()
@@ -43,10 +46,8 @@ def nszu_list():
         year = datetime.now().year
         month = datetime.now().month
 
-    # Filter by month
-    start_date = datetime(year, month, 1).date()
-    last_day = monthrange(year, month)[1]
-    end_date = datetime(year, month, last_day).date()
+    # Filter by month: [1-ше число, 1-ше число наступного) — як у records/ambulatory
+    start_date, end_date = month_bounds(year, month)
 
     # Filtering
     selected_status = request.args.get('status', '').strip()
@@ -55,7 +56,7 @@ def nszu_list():
 
     conditions = [
         NSZUCorrection.date >= start_date,
-        NSZUCorrection.date <= end_date
+        NSZUCorrection.date < end_date
     ]
     if selected_status:
         conditions.append(NSZUCorrection.status == selected_status)
@@ -114,7 +115,6 @@ def nszu_list():
     count = pagination.total
 
     # Calculate quick statistics for filtered records
-    from sqlalchemy import func
     filtered_stats = db.session.query(
         NSZUCorrection.status,
         func.count(NSZUCorrection.id).label('count'),
@@ -131,17 +131,10 @@ def nszu_list():
     now = datetime.now()
     current_month_str = f'{now.year:04d}-{now.month:02d}'
 
-    # Previous month
-    if month == 1:
-        prev_month_str = f'{year-1:04d}-12'
-    else:
-        prev_month_str = f'{year:04d}-{month-1:02d}'
-
-    # Next month
-    if month == 12:
-        next_month_str = f'{year+1:04d}-01'
-    else:
-        next_month_str = f'{year:04d}-{month+1:02d}'
+    # Previous / next month: від меж поточного, без розгалужень на січень/грудень
+    prev_month = start_date - timedelta(days=1)
+    prev_month_str = f'{prev_month.year:04d}-{prev_month.month:02d}'
+    next_month_str = f'{end_date.year:04d}-{end_date.month:02d}'
 
     return render_template('nszu_list.html',
                          corrections=corrections,
@@ -402,8 +395,8 @@ def nszu_export():
         if not from_str or not to_str:
             flash('Будь ласка, вкажіть обидві дати (з та по) для експорту', 'warning')
             return redirect(url_for('nszu.nszu_list'))
-        from_d = datetime.strptime(from_str, '%Y-%m-%d').date()
-        to_d = datetime.strptime(to_str, '%Y-%m-%d').date()
+        from_d = date.fromisoformat(from_str)
+        to_d = date.fromisoformat(to_str)
     except ValueError:
         flash('Невірний формат дати для експорту', 'warning')
         return redirect(url_for('nszu.nszu_list'))
@@ -431,41 +424,20 @@ def nszu_export():
 
     q = NSZUCorrection.query.filter(*conditions)
 
-    total_count = q.count()
-
-    if total_count == 0:
-        flash('Записів не знайдено для обраного діапазону дат', 'warning')
-        return redirect(url_for('nszu.nszu_list'))
-
-    # Create Excel
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, numbers
-        from openpyxl.utils import get_column_letter
-    except Exception:
-        flash('Для експорту потрібен пакет openpyxl', 'danger')
-        return redirect(url_for('nszu.nszu_list'))
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'NSZU'
-
     # Headers
     headers = ['ID', 'Дата', 'НСЗУ ID', 'Лікар', 'Статус', 'Деталі', 'Факт. сума', 'Коментар', 'Створив', 'Створено', 'Оновив', 'Оновлено']
-    ws.append(headers)
-
-    # Style headers
-    bold = Font(bold=True)
-    for cell in ws[1]:
-        cell.font = bold
-        cell.alignment = Alignment(horizontal='center', vertical='center')
 
     # Get user mapping
     user_map = get_user_map()
 
-    # Add data
-    for c in q.order_by(NSZUCorrection.date.desc()).all():
-        row = [
+    # Add data: Row-кортежі лише з потрібних колонок, без ORM-гідратації;
+    # генератор поверх yield_per — рядки одразу йдуть у build_xlsx
+    columns = (NSZUCorrection.id, NSZUCorrection.date, NSZUCorrection.nszu_record_id, NSZUCorrection.doctor,
+               NSZUCorrection.status, NSZUCorrection.detail, NSZUCorrection.fakt_summ, NSZUCorrection.comment,
+               NSZUCorrection.created_by, NSZUCorrection.created_at,
+               NSZUCorrection.updated_by, NSZUCorrection.updated_at)
+    rows = (
+        [
             c.id,
             c.date.strftime('%d.%m.%Y') if c.date else '',
             c.nszu_record_id or '',
@@ -479,20 +451,18 @@ def nszu_export():
             user_map.get(c.updated_by, c.updated_by or '') if c.updated_by else '',
             c.updated_at.strftime('%d.%m.%Y %H:%M') if c.updated_at else '',
         ]
-        ws.append(row)
+        for c in q.with_entities(*columns).order_by(NSZUCorrection.date.desc()).yield_per(1000)
+    )
 
-    # Format sum column as number with 2 decimal places
-    for row in range(2, ws.max_row + 1):
-        ws.cell(row=row, column=7).number_format = numbers.FORMAT_NUMBER_00
+    # Sum column as number with 2 decimal places
+    wb, count = build_xlsx('NSZU', headers, rows, number_formats={6: '0.00'})
 
-    # Auto-adjust column widths
-    for column_cells in ws.columns:
-        length = max(len(str(cell.value or '')) for cell in column_cells)
-        ws.column_dimensions[get_column_letter(column_cells[0].column)].width = min(length + 2, 50)
+    # Порожній результат видно з кількості записаних рядків — без окремого COUNT-запиту наперед
+    if not count:
+        flash('Записів не знайдено для обраного діапазону дат', 'warning')
+        return redirect(url_for('nszu.nszu_list'))
 
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
+    bio = xlsx_file(wb)
 
     # Build filename with filters info
     filename_parts = ['nszu', f'{from_d.year}-{from_d.month:02d}']
@@ -502,7 +472,7 @@ def nszu_export():
     filename = f"{'_'.join(filename_parts)}.xlsx"
 
     try:
-        log_details = f'from={from_d} to={to_d} status={status_filter} doctor={doctor_filter} count={total_count}'
+        log_details = f'from={from_d} to={to_d} status={status_filter} doctor={doctor_filter} count={count}'
         log_action(current_user.id, 'nszu.export', 'export', None, log_details)
         db.session.commit()
     except Exception:
@@ -510,7 +480,7 @@ def nszu_export():
 
     current_app.logger.info(f'NSZU export by {current_user.username}: {log_details}')
 
-    return send_file(bio, as_attachment=True, download_name=filename, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return send_xlsx(bio, filename)
 
 
 @nszu_bp.route('/print', methods=['POST'])
@@ -523,8 +493,8 @@ def print_nszu():
         if not from_str or not to_str:
             flash('Будь ласка, вкажіть обидві дати для друку', 'warning')
             return redirect(url_for('nszu.nszu_list'))
-        from_d = datetime.strptime(from_str, '%Y-%m-%d').date()
-        to_d = datetime.strptime(to_str, '%Y-%m-%d').date()
+        from_d = date.fromisoformat(from_str)
+        to_d = date.fromisoformat(to_str)
     except ValueError:
         flash('Невірний формат дати для друку', 'warning')
         return redirect(url_for('nszu.nszu_list'))
@@ -566,7 +536,7 @@ def print_nszu():
                                  doctor_filter=doctor_filter,
                                  nszu_id_filter=nszu_id_filter,
                                  generated_by=current_user.username,
-                                 generated_at=datetime.now(timezone(timedelta(hours=2))))
+                                 generated_at=datetime.now(KYIV_TZ))
 
     # Generate PDF with WeasyPrint
     try:
@@ -5,38 +5,43 @@ Records (Dashboard) routes - main application routes for medical records
 
 from flask import render_template, redirect, url_for, flash, request, current_app, send_file, jsonify
 from flask_login import login_required, current_user
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 from io import BytesIO
-from sqlalchemy.orm import joinedload
-from sqlalchemy import func, case
+from sqlalchemy.orm import defer, selectinload, raiseload
+from sqlalchemy import func, case, insert
 
 from app.extensions import db
-from models import Record, User, Department, log_action
+from models import Record, User, log_action
 from decorators import role_required
 from utils import (parse_date, parse_integer, parse_numeric, clear_dropdown_cache,
                    get_user_map, escape_like, validate_record_form,
-                   get_distinct_statuses, get_distinct_physicians, get_distinct_departments,
-                   get_status_options, get_default_status)
-from constants import STATUS_DISCHARGED, STATUS_PROCESSING, STATUS_VIOLATIONS
+                   get_departments, get_distinct_physicians, get_record_dropdowns,
+                   get_status_options, get_default_status, month_bounds,
+                   history_search_condition, preserved_filters, build_xlsx, xlsx_file, send_xlsx)
+from constants import KYIV_TZ, STATUS_DISCHARGED, STATUS_PROCESSING, STATUS_VIOLATIONS
 from . import records_bp
 
+# Фільтри дашборду, що передаються у формах додавання/редагування як filter_<key>
+_FORM_FILTER_KEYS = ('discharge_status', 'treating_physician', 'history')
+
 
 # Routes
 @records_bp.route('/')
 @login_required
 def index():
+    role = current_user.role
+
     # Redirect ambulatory role to ambulatory index
-    if current_user.role == 'ambulatory':
+    if role == 'ambulatory':
         return redirect(url_for('ambulatory.index'))
 
     # Redirect viewer to statistics page ONLY if no filters applied
-    if current_user.role == 'viewer' and not request.args:
+    if role == 'viewer' and not request.args:
         return redirect(url_for('admin.admin_statistics'))
 
     # Use Kyiv timezone (UTC+2, or UTC+3 during DST) for correct month detection
     # Simple approach: use UTC+2 as base (covers most of the year)
-    kyiv_tz = timezone(timedelta(hours=2))
-    now = datetime.now(kyiv_tz)
+    now = datetime.now(KYIV_TZ)
 
     # support a toggle to show all months
     show_all = request.args.get('all_months', '').lower() in ('1', 'true', 'yes')
@@ -46,65 +51,45 @@ def index():
     month_input = request.args.get('month_filter', '').strip()
     from_date_input = request.args.get('from_date', '').strip()
     to_date_input = request.args.get('to_date', '').strip()
-    selected_month = None
-    selected_year = None
+
+    # Default to current month; [start, end) — end exclusive
+    selected_year, selected_month = now.year, now.month
+    start, end = month_bounds(now.year, now.month)
 
     try:
         if from_date_input and to_date_input:
             # Date range mode from statistics page
-            from datetime import date as date_type
-            fd = date_type.fromisoformat(from_date_input)
-            td = date_type.fromisoformat(to_date_input)
+            fd = date.fromisoformat(from_date_input)
+            td = date.fromisoformat(to_date_input)
             if fd > td:
                 fd, td = td, fd
-            start = datetime(fd.year, fd.month, fd.day)
-            end = datetime(td.year, td.month, td.day) + timedelta(days=1)
-            selected_year = fd.year
-            selected_month = fd.month
+            start, end = fd, td + timedelta(days=1)
+            selected_year, selected_month = fd.year, fd.month
         elif month_input:
             # Parse HTML5 month input format: YYYY-MM
-            parts = month_input.split('-')
-            if len(parts) == 2:
-                selected_year = int(parts[0])
-                selected_month = int(parts[1])
-                if 1 <= selected_month <= 12:
-                    start = datetime(selected_year, selected_month, 1)
-                    if selected_month == 12:
-                        end = datetime(selected_year + 1, 1, 1)
-                    else:
-                        end = datetime(selected_year, selected_month + 1, 1)
-                else:
-                    raise ValueError()
-            else:
-                raise ValueError()
-        else:
-            # Default to current month
-            start = datetime(now.year, now.month, 1)
-            selected_year = now.year
-            selected_month = now.month
-            if now.month == 12:
-                end = datetime(now.year + 1, 1, 1)
-            else:
-                end = datetime(now.year, now.month + 1, 1)
+            year_str, month_str = month_input.split('-')
+            year, month = int(year_str), int(month_str)
+            start, end = month_bounds(year, month)
+            selected_year, selected_month = year, month
     except Exception:
-        # fallback to current month
-        start = datetime(now.year, now.month, 1)
-        selected_year = now.year
-        selected_month = now.month
-        if now.month == 12:
-            end = datetime(now.year + 1, 1, 1)
-        else:
-            end = datetime(now.year, now.month + 1, 1)
+        # invalid input — fall back to current month (already set above)
+        pass
 
     # base query (by default for current month, unless show_all)
-    q = Record.query.options(joinedload(Record.creator), joinedload(Record.updater))
+    # selectinload: кілька користувачів на тисячі записів — один IN-запит
+    # замість LEFT JOIN, що дублює колонки users у кожному рядку.
+    # raiseload('*'): будь-яке інше ліниве звернення з шаблону — одразу помилка, а не N+1
+    # created_at/updated_at таблиця не показує (сортування по них працює і без
+    # завантаження) — не тягнемо й не парсимо datetime для кожного рядка
+    q = Record.query.options(selectinload(Record.creator), selectinload(Record.updater), raiseload('*'),
+                             defer(Record.created_at, raiseload=True), defer(Record.updated_at, raiseload=True))
     date_conditions = []
     if not show_all:
         # show records discharged in the current month by date_of_discharge
         date_conditions = [
             Record.date_of_discharge != None,
-            Record.date_of_discharge >= start.date(),
-            Record.date_of_discharge < end.date(),
+            Record.date_of_discharge >= start,
+            Record.date_of_discharge < end,
         ]
         q = q.filter(*date_conditions)
 
@@ -125,7 +110,7 @@ def index():
     if selected_department:
         conditions.append(Record.discharge_department == selected_department)
     if history_q:
-        conditions.append(Record.history.like(f'%{escape_like(history_q)}%', escape='\\'))
+        conditions.append(history_search_condition(history_q))
     if full_name_q:
         conditions.append(Record.full_name.ilike(f'%{escape_like(full_name_q)}%', escape='\\'))
     if has_death_date:
@@ -138,9 +123,7 @@ def index():
         q = q.filter(*conditions)
 
     # values for dropdowns (cached)
-    statuses = get_distinct_statuses()
-    physicians = get_distinct_physicians()
-    departments = get_distinct_departments()
+    statuses, physicians, departments = get_record_dropdowns()
 
     # Sorting
     sort_by = request.args.get('sort_by', 'date_of_discharge')
@@ -173,47 +156,48 @@ def index():
                 q = q.order_by(func.lower(col).desc())
             else:
                 q = q.order_by(col.desc())
-
-    # Calculate statistics counts BEFORE pagination
-    # Total count
-    count = q.count()
-
-    # Count deceased (priority: any record with date_of_death)
-    count_deceased = q.filter(Record.date_of_death != None).count()
-
-    # Other counts: EXCLUDE records with date_of_death
-    q_alive = q.filter(Record.date_of_death == None)
-    count_discharged = q_alive.filter(Record.discharge_status == STATUS_DISCHARGED).count()
-    count_processing = q_alive.filter(Record.discharge_status == STATUS_PROCESSING).count()
-    count_violations = q_alive.filter(Record.discharge_status == STATUS_VIOLATIONS).count()
-
-    # Лічильники ургентних і зданих (по всьому поточному filtered set)
-    count_urgent = q.filter(Record.is_urgent == True).count()
-    count_planned = q.filter(Record.is_urgent == False).count()
-    count_submitted = q.filter(Record.history_submitted == True).count()
-    count_not_submitted = q.filter(Record.history_submitted == False).count()
+    # id як тай-брейкер: стабільний порядок між сторінками (OFFSET не губить і
+    # не дублює рядки з однаковою датою), а (date_of_discharge, rowid) — це
+    # вже ключ idx_record_date_of_discharge, тож сортування йде по індексу
+    q = q.order_by(Record.id.asc() if sort_order == 'asc' else Record.id.desc())
 
     # Довідник статусів: селекти/бейджі + динамічні піли для несистемних
     # статусів (рахуються за тим самим правилом — без дати смерті)
     status_defs = get_status_options('records')
     status_meta = {s['name']: s for s in get_status_options('records', include_inactive=True)}
-    extra_status_counts = {}
-    if any(s['show_in_stats'] and not s['is_system'] for s in status_defs):
-        counts_q = db.session.query(Record.discharge_status, func.count(Record.id)) \
-            .filter(Record.date_of_death == None)
-        if date_conditions:
-            counts_q = counts_q.filter(*date_conditions)
-        if conditions:
-            counts_q = counts_q.filter(*conditions)
-        extra_status_counts = {name: cnt for name, cnt in
-                               counts_q.group_by(Record.discharge_status).all() if name}
+    extra_statuses = [s['name'] for s in status_defs if s['show_in_stats'] and not s['is_system']]
+
+    # Усі лічильники пілів і загальна кількість — один агрегатний SELECT
+    # (COUNT(CASE ...)) по тому ж фільтру замість восьми окремих COUNT-підзапитів,
+    # GROUP BY для динамічних пілів і ще одного COUNT всередині paginate()
+    alive = Record.date_of_death == None
+    counts = db.session.query(
+        func.count(Record.id),
+        # Count deceased (priority: any record with date_of_death)
+        func.count(case((Record.date_of_death != None, 1))),
+        # Other counts: EXCLUDE records with date_of_death
+        func.count(case((alive & (Record.discharge_status == STATUS_DISCHARGED), 1))),
+        func.count(case((alive & (Record.discharge_status == STATUS_PROCESSING), 1))),
+        func.count(case((alive & (Record.discharge_status == STATUS_VIOLATIONS), 1))),
+        # Лічильники ургентних і зданих (по всьому поточному filtered set)
+        func.count(case((Record.is_urgent == True, 1))),
+        func.count(case((Record.is_urgent == False, 1))),
+        func.count(case((Record.history_submitted == True, 1))),
+        func.count(case((Record.history_submitted == False, 1))),
+        *(func.count(case((alive & (Record.discharge_status == name), 1))) for name in extra_statuses),
+    ).filter(*date_conditions, *conditions).one()
+    (count, count_deceased, count_discharged, count_processing, count_violations,
+     count_urgent, count_planned, count_submitted, count_not_submitted) = counts[:9]
+    extra_status_counts = dict(zip(extra_statuses, counts[9:]))
 
     # Pagination
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 100, type=int)
     per_page = max(10, min(per_page, 200))
 
-    pagination = q.paginate(page=page, per_page=per_page, error_out=False)
+    # total уже пораховано агрегатом вище — paginate() не робить власний COUNT
+    pagination = q.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagination.total = count
     records = pagination.items
 
     # user mapping for created_by / updated_by
@@ -262,9 +246,7 @@ def index():
 @role_required('editor', 'viewer')
 def export():
     """Export records to Excel based on form data (month or date range)"""
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    from openpyxl.utils import get_column_letter
+    user = current_user._get_current_object()
 
     export_mode = request.form.get('export_mode', 'month').strip()
 
@@ -276,8 +258,8 @@ def export():
             flash('Будь ласка, вкажіть обидві дати для експорту', 'warning')
             return redirect(url_for('records.index'))
         try:
-            from_d = datetime.strptime(from_str, '%Y-%m-%d').date()
-            to_d = datetime.strptime(to_str, '%Y-%m-%d').date()
+            from_d = date.fromisoformat(from_str)
+            to_d = date.fromisoformat(to_str)
         except ValueError:
             flash('Невірний формат дати', 'warning')
             return redirect(url_for('records.index'))
@@ -302,15 +284,9 @@ def export():
                 raise ValueError()
             year = int(parts[0])
             month = int(parts[1])
-            if not (1 <= month <= 12):
-                raise ValueError()
-            from_d = datetime(year, month, 1).date()
-            if month == 12:
-                to_d = datetime(year + 1, 1, 1).date()
-            else:
-                to_d = datetime(year, month + 1, 1).date()
+            from_d, next_month = month_bounds(year, month)
             # adjust to_d so it's inclusive (last day of month)
-            to_d = to_d - timedelta(days=1)
+            to_d = next_month - timedelta(days=1)
             conditions = [
                 Record.date_of_discharge != None,
                 Record.date_of_discharge >= from_d,
@@ -334,112 +310,94 @@ def export():
     if discharge_department:
         conditions.append(Record.discharge_department == discharge_department)
     if history_q:
-        conditions.append(Record.history.like(f'%{escape_like(history_q)}%', escape='\\'))
+        conditions.append(history_search_condition(history_q))
     if full_name_q:
         conditions.append(Record.full_name.ilike(f'%{escape_like(full_name_q)}%', escape='\\'))
 
     q = Record.query.filter(*conditions)
-    records = q.order_by(Record.date_of_discharge.desc()).all()
-
-    if not records:
-        flash('Записів не знайдено для експорту', 'warning')
-        return redirect(url_for('records.index'))
 
     # Determine access level
-    use_write_only = current_user.role == 'viewer'
+    use_write_only = user.role == 'viewer'
 
     # user mapping for creator/updater names
     user_map = get_user_map()
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Записи'
-
     # Headers
     if use_write_only:
         headers = ['ID', 'Дата виписки', 'ПІБ', 'Відділення', 'Лікар', 'Історія хвороби', 'К днів', 'Статус виписки']
     else:
         headers = ['ID', 'Дата виписки', 'ПІБ', 'Відділення', 'Лікар', 'Історія хвороби', 'К днів', 'Статус виписки', 'АДСЖ', 'Сума', 'Дата смерті', 'Коментар', 'Створено', 'Оновлено', 'Автор', 'Редактор']
 
-    ws.append(headers)
-
-    # Style header row
-    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-
-    # Data rows
-    for r in records:
-        if use_write_only:
-            row = [
-                r.id,
-                r.date_of_discharge.strftime('%d.%m.%Y') if r.date_of_discharge else '',
-                r.full_name,
-                r.discharge_department or '',
-                r.treating_physician,
-                r.history,
-                r.k_days,
-                r.discharge_status or ''
-            ]
-        else:
-            row = [
-                r.id,
-                r.date_of_discharge.strftime('%d.%m.%Y') if r.date_of_discharge else '',
-                r.full_name,
-                r.discharge_department or '',
-                r.treating_physician,
-                r.history,
-                r.k_days,
-                r.discharge_status or '',
-                r.adsj or '',
-                f"{int(r.suma):,}".replace(",", " ") if r.suma is not None else '',
-                r.date_of_death.strftime('%d.%m.%Y') if r.date_of_death else '',
-                r.comment or '',
-                r.created_at.strftime('%d.%m.%Y %H:%M') if r.created_at else '',
-                r.updated_at.strftime('%d.%m.%Y %H:%M') if r.updated_at else '',
-                user_map.get(r.created_by, ''),
-                user_map.get(r.updated_by, '')
-            ]
-        ws.append(row)
-
-    # Auto-size columns
-    for i, col in enumerate(ws.columns, 1):
-        max_length = 0
-        column = get_column_letter(i)
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except Exception:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column].width = adjusted_width
-
-    # Save to BytesIO
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
+    # Лише колонки, що йдуть у файл: with_entities повертає легкі Row-кортежі
+    # (r.<колонка> працює так само) без ORM-гідратації та identity map
+    columns = [Record.id, Record.date_of_discharge, Record.full_name, Record.discharge_department,
+               Record.treating_physician, Record.history, Record.k_days, Record.discharge_status]
+    if not use_write_only:
+        columns += [Record.adsj, Record.suma, Record.date_of_death, Record.comment,
+                    Record.created_at, Record.updated_at, Record.created_by, Record.updated_by]
+
+    # Data rows: генератор поверх yield_per — рядки читаються пачками по 1000
+    # і одразу йдуть у build_xlsx, без списку всіх рядків у пам'яті
+    def export_rows():
+        for r in q.with_entities(*columns).order_by(Record.date_of_discharge.desc()).yield_per(1000):
+            if use_write_only:
+                yield [
+                    r.id,
+                    r.date_of_discharge.strftime('%d.%m.%Y') if r.date_of_discharge else '',
+                    r.full_name,
+                    r.discharge_department or '',
+                    r.treating_physician,
+                    r.history,
+                    r.k_days,
+                    r.discharge_status or ''
+                ]
+            else:
+                yield [
+                    r.id,
+                    r.date_of_discharge.strftime('%d.%m.%Y') if r.date_of_discharge else '',
+                    r.full_name,
+                    r.discharge_department or '',
+                    r.treating_physician,
+                    r.history,
+                    r.k_days,
+                    r.discharge_status or '',
+                    r.adsj or '',
+                    f"{int(r.suma):,}".replace(",", " ") if r.suma is not None else '',
+                    r.date_of_death.strftime('%d.%m.%Y') if r.date_of_death else '',
+                    r.comment or '',
+                    r.created_at.strftime('%d.%m.%Y %H:%M') if r.created_at else '',
+                    r.updated_at.strftime('%d.%m.%Y %H:%M') if r.updated_at else '',
+                    user_map.get(r.created_by, ''),
+                    user_map.get(r.updated_by, '')
+                ]
+
+    # Рядки пишуться одразу в XML, без Cell-об'єктів на кожну клітинку
+    wb, count = build_xlsx('Записи', headers, export_rows(), header_color='366092')
+
+    # Порожній результат видно з кількості записаних рядків — без окремого COUNT
+    if not count:
+        flash('Записів не знайдено для експорту', 'warning')
+        return redirect(url_for('records.index'))
+
+    bio = xlsx_file(wb)
 
     # Generate filename
     if export_mode == 'range':
         filename = f"vipiski_export_{from_d.strftime('%d-%m-%Y')}_{to_d.strftime('%d-%m-%Y')}.xlsx"
-        log_details = f'from={from_d} to={to_d} status={discharge_status} count={len(records)}'
+        log_details = f'from={from_d} to={to_d} status={discharge_status} count={count}'
     else:
         filename = f"vipiski_export_{from_d.strftime('%m-%Y')}.xlsx"
-        log_details = f'month={from_d.strftime("%m-%Y")} status={discharge_status} count={len(records)}'
+        log_details = f'month={from_d.strftime("%m-%Y")} status={discharge_status} count={count}'
 
     # Audit log
     try:
-        log_action(current_user.id, 'records.export', 'export', None, log_details)
+        log_action(user.id, 'records.export', 'export', None, log_details)
         db.session.commit()
     except Exception:
         current_app.logger.exception('Failed to write audit log for export')
-    current_app.logger.info(f'Export by {getattr(current_user, "username", "unknown")}: {log_details} write_only={use_write_only}')
+    current_app.logger.info(f'Export by {user.username}: {log_details} write_only={use_write_only}')
 
-    return send_file(bio, as_attachment=True, download_name=filename, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return send_xlsx(bio, filename)
 
 
 @records_bp.route('/records/print', methods=['POST'])
@@ -452,8 +410,8 @@ def print_records():
         if not from_str or not to_str:
             flash('Будь ласка, вкажіть обидві дати для друку', 'warning')
             return redirect(url_for('records.index'))
-        from_d = datetime.strptime(from_str, '%Y-%m-%d').date()
-        to_d = datetime.strptime(to_str, '%Y-%m-%d').date()
+        from_d = date.fromisoformat(from_str)
+        to_d = date.fromisoformat(to_str)
     except ValueError:
         flash('Невірний формат дати', 'warning')
         return redirect(url_for('records.index'))
@@ -482,7 +440,7 @@ def print_records():
     if discharge_department:
         conditions.append(Record.discharge_department == discharge_department)
     if history_q:
-        conditions.append(Record.history.like(f'%{escape_like(history_q)}%', escape='\\'))
+        conditions.append(history_search_condition(history_q))
     if full_name_q:
         conditions.append(Record.full_name.ilike(f'%{escape_like(full_name_q)}%', escape='\\'))
 
@@ -506,7 +464,7 @@ def print_records():
                                  discharge_department=discharge_department,
                                  user_map=user_map,
                                  generated_by=current_user.username,
-                                 generated_at=datetime.now(timezone(timedelta(hours=2))))
+                                 generated_at=datetime.now(KYIV_TZ))
 
     # Generate PDF
     try:
@@ -533,51 +491,56 @@ def print_records():
     return send_file(bio, as_attachment=True, download_name=filename, mimetype='application/pdf')
 
 
+def _insert_record(data):
+    """Вставити новий запис одним Core INSERT (без Record() і unit-of-work).
+    Повертає id; коміт — на стороні виклику, разом з log_action."""
+    user = current_user._get_current_object()
+    privileged = user.role in ('operator', 'admin')
+    result = db.session.execute(insert(Record).values(
+        date_of_discharge=data['date_of_discharge'],
+        full_name=data['full_name'],
+        discharge_department=data['discharge_department'],
+        treating_physician=data['treating_physician'],
+        history=data['history'],
+        k_days=data['k_days'],
+        discharge_status=get_default_status('records'),
+        date_of_death=data['date_of_death'],
+        comment=data['comment'],
+        is_urgent=data['is_urgent'] if privileged else None,
+        history_submitted=data['history_submitted'] if privileged else False,
+        created_by=user.id,
+        updated_by=user.id,
+    ))
+    return result.inserted_primary_key[0]
+
+
 @records_bp.route('/records/add', methods=['GET', 'POST'])
 @role_required('operator')
 def add_record():
 
+    user = current_user._get_current_object()
     if request.method == 'POST':
-        data, error = validate_record_form(request.form)
+        # Поля форми — один раз у звичайний dict замість MultiDict-пошуків
+        form = request.form.to_dict()
+        data, error = validate_record_form(form)
         if error:
             flash(error, 'warning')
             return redirect(url_for('records.add_record'))
 
-        r = Record(
-            date_of_discharge=data['date_of_discharge'],
-            full_name=data['full_name'],
-            discharge_department=data['discharge_department'],
-            treating_physician=data['treating_physician'],
-            history=data['history'],
-            k_days=data['k_days'],
-            discharge_status=get_default_status('records'),
-            date_of_death=data['date_of_death'],
-            comment=data['comment'],
-            is_urgent=data['is_urgent'] if current_user.role in ('operator', 'admin') else None,
-            history_submitted=data['history_submitted'] if current_user.role in ('operator', 'admin') else False,
-            created_by=current_user.id,
-            updated_by=current_user.id
-        )
-        db.session.add(r)
-        db.session.flush()  # assigns r.id
-        log_action(current_user.id, 'record.create', 'record', r.id, f'full_name={r.full_name}')
+        record_id = _insert_record(data)
+        log_action(user.id, 'record.create', 'record', record_id, f"full_name={data['full_name']}")
         db.session.commit()
         # Clear dropdown cache so newly added values appear in dropdowns
         clear_dropdown_cache()
-        current_app.logger.info(f'Record created: {r.id} by {current_user.username}')
-        flash(f'Запис "{r.full_name}" успішно додано', 'success')
+        current_app.logger.info(f'Record created: {record_id} by {user.username}')
+        flash(f'Запис "{data["full_name"]}" успішно додано', 'success')
         # preserve filters from form (if any)
-        params = {}
-        for k in ('discharge_status', 'treating_physician', 'history'):
-            v = request.form.get(f'filter_{k}', '').strip()
-            if v:
-                params[k] = v
-        if request.form.get('filter_has_death_date', '').strip():
-            params['has_death_date'] = '1'
+        params = preserved_filters(form, _FORM_FILTER_KEYS, 'filter_', ('has_death_date',))
         return redirect(url_for('records.index', **params))
 
     # GET: pass through any filters so add form can include hidden fields and departments
-    departments = Department.query.order_by(Department.name).all()
+    # Довідник відділень змінює лише адмін — кешований список замість SELECT на кожну форму
+    departments = get_departments()
     # Get distinct physicians for autocomplete (cached)
     physicians = get_distinct_physicians()
     return render_template('add_record.html', selected_status=request.args.get('discharge_status', ''), selected_physician=request.args.get('treating_physician', ''), history_q=request.args.get('history', ''), departments=departments, selected_department=request.args.get('discharge_department', ''), physicians=physicians)
@@ -587,44 +550,28 @@ def add_record():
 @role_required('operator')
 def api_add_record():
     """AJAX endpoint for adding records with support for 'save and add another'"""
-    current_app.logger.info(f'API add_record called by {current_user.username}')
+    user = current_user._get_current_object()
+    current_app.logger.info(f'API add_record called by {user.username}')
 
     data, error = validate_record_form(request.form)
     if error:
         return jsonify({'success': False, 'error': error}), 400
 
-    r = Record(
-        date_of_discharge=data['date_of_discharge'],
-        full_name=data['full_name'],
-        discharge_department=data['discharge_department'],
-        treating_physician=data['treating_physician'],
-        history=data['history'],
-        k_days=data['k_days'],
-        discharge_status=get_default_status('records'),
-        date_of_death=data['date_of_death'],
-        comment=data['comment'],
-        is_urgent=data['is_urgent'] if current_user.role in ('operator', 'admin') else None,
-        history_submitted=data['history_submitted'] if current_user.role in ('operator', 'admin') else False,
-        created_by=current_user.id,
-        updated_by=current_user.id
-    )
-
     try:
-        db.session.add(r)
-        db.session.flush()  # assigns r.id
-        log_action(current_user.id, 'record.create', 'record', r.id, f'full_name={r.full_name}')
+        record_id = _insert_record(data)
+        log_action(user.id, 'record.create', 'record', record_id, f"full_name={data['full_name']}")
         db.session.commit()
 
         # Clear dropdown cache
         clear_dropdown_cache()
 
-        current_app.logger.info(f'Record created via AJAX: {r.id} by {current_user.username}')
+        current_app.logger.info(f'Record created via AJAX: {record_id} by {user.username}')
 
         return jsonify({
             'success': True,
-            'record_id': r.id,
-            'full_name': r.full_name,
-            'message': f'Запис "{r.full_name}" успішно додано'
+            'record_id': record_id,
+            'full_name': data['full_name'],
+            'message': f'Запис "{data["full_name"]}" успішно додано'
         })
 
     except Exception as e:
@@ -668,7 +615,8 @@ def api_update_record_status(record_id):
 @role_required('editor')
 def api_edit_record(record_id):
     """AJAX endpoint for editing records"""
-    current_app.logger.info(f'API edit_record called by {current_user.username} for record {record_id}')
+    user = current_user._get_current_object()
+    current_app.logger.info(f'API edit_record called by {user.username} for record {record_id}')
 
     r = db.get_or_404(Record, record_id)
 
@@ -687,20 +635,20 @@ def api_edit_record(record_id):
     r.comment = data['comment']
     r.adsj = data['adsj']
     r.suma = data['suma']
-    if current_user.role in ('operator', 'admin'):
+    if user.role in ('operator', 'admin'):
         r.is_urgent = data['is_urgent']
         r.history_submitted = data['history_submitted']
-    r.updated_by = current_user.id
+    r.updated_by = user.id
     r.updated_at = datetime.now(timezone.utc)
 
     try:
-        log_action(current_user.id, 'record.update', 'record', r.id, f'full_name={r.full_name}')
+        log_action(user.id, 'record.update', 'record', r.id, f'full_name={r.full_name}')
         db.session.commit()
 
         # Clear dropdown cache
         clear_dropdown_cache()
 
-        current_app.logger.info(f'Record updated via AJAX: {r.id} by {current_user.username}')
+        current_app.logger.info(f'Record updated via AJAX: {r.id} by {user.username}')
 
         return jsonify({
             'success': True,
@@ -719,10 +667,12 @@ def api_edit_record(record_id):
 @role_required('editor')
 def edit_record(record_id):
 
+    user = current_user._get_current_object()
     r = db.get_or_404(Record, record_id)
 
     if request.method == 'POST':
-        data, error = validate_record_form(request.form, require_status_and_dept=True)
+        form = request.form.to_dict()
+        data, error = validate_record_form(form, require_status_and_dept=True)
         if error:
             flash(error, 'warning')
             return redirect(url_for('records.edit_record', record_id=record_id))
@@ -738,14 +688,14 @@ def edit_record(record_id):
         r.comment = data['comment']
         r.adsj = data['adsj']
         r.suma = data['suma']
-        if current_user.role in ('operator', 'admin'):
+        if user.role in ('operator', 'admin'):
             r.is_urgent = data['is_urgent']
             r.history_submitted = data['history_submitted']
-        r.updated_by = current_user.id
+        r.updated_by = user.id
         r.updated_at = datetime.now(timezone.utc)
 
         try:
-            log_action(current_user.id, 'record.update', 'record', r.id, f'full_name={r.full_name}')
+            log_action(user.id, 'record.update', 'record', r.id, f'full_name={r.full_name}')
             db.session.commit()
         except Exception:
             db.session.rollback()
@@ -754,20 +704,14 @@ def edit_record(record_id):
             return redirect(url_for('records.edit_record', record_id=record_id))
         # Clear dropdown cache after editing record
         clear_dropdown_cache()
-        current_app.logger.info(f'Record updated: {r.id} by {current_user.username}')
+        current_app.logger.info(f'Record updated: {r.id} by {user.username}')
         flash(f'Запис #{r.id} ({r.full_name}) успішно оновлено', 'success')
-        params = {}
-        for k in ('discharge_status', 'treating_physician', 'history'):
-            v = request.form.get(f'filter_{k}', '').strip()
-            if v:
-                params[k] = v
-        if request.form.get('filter_has_death_date', '').strip():
-            params['has_death_date'] = '1'
+        params = preserved_filters(form, _FORM_FILTER_KEYS, 'filter_', ('has_death_date',))
         # Add anchor to scroll to edited record
         return redirect(url_for('records.index', **params, _anchor=f'record-{r.id}'))
 
     # GET -> render form with record data (pass filters through if present) and departments
-    departments = Department.query.order_by(Department.name).all()
+    departments = get_departments()
     # Get distinct physicians for autocomplete (cached)
     physicians = get_distinct_physicians()
     return render_template('edit_record.html', r=r, status_defs=get_status_options('records'), selected_status=request.args.get('discharge_status', ''), selected_physician=request.args.get('treating_physician', ''), history_q=request.args.get('history', ''), departments=departments, physicians=physicians)
@@ -787,13 +731,8 @@ def delete_record(record_id):
     current_app.logger.info(f'Record deleted: {saved_id} by {current_user.username}')
     flash(f'Запис #{saved_id} ({saved_name}) видалено', 'danger')
     # preserve filters from form (if any)
-    params = {}
-    for k in ('discharge_status', 'treating_physician', 'discharge_department', 'history', 'full_name'):
-        v = request.form.get(k, '').strip()
-        if v:
-            params[k] = v
-    if request.form.get('has_death_date', '').strip():
-        params['has_death_date'] = '1'
+    params = preserved_filters(request.form, ('discharge_status', 'treating_physician', 'discharge_department',
+                                              'history', 'full_name'), flags=('has_death_date',))
     return redirect(url_for('records.index', **params))
 
 
@@ -806,8 +745,8 @@ def report_submission():
         flash('Будь ласка, вкажіть обидві дати', 'warning')
         return redirect(url_for('records.index'))
     try:
-        from_d = datetime.strptime(from_str, '%Y-%m-%d').date()
-        to_d = datetime.strptime(to_str, '%Y-%m-%d').date()
+        from_d = date.fromisoformat(from_str)
+        to_d = date.fromisoformat(to_str)
     except ValueError:
         flash('Невірний формат дати', 'warning')
         return redirect(url_for('records.index'))
@@ -844,7 +783,6 @@ def report_submission():
         func.sum(case((Record.history_submitted == False, 1), else_=0)).desc()
     ).all()
 
-    kyiv_tz = timezone(timedelta(hours=2))
     try:
         from weasyprint import HTML
     except ImportError:
@@ -860,7 +798,7 @@ def report_submission():
         submission_not_submitted=submission_row.not_submitted or 0,
         submission_by_physician=submission_by_physician,
         generated_by=current_user.username,
-        generated_at=datetime.now(kyiv_tz),
+        generated_at=datetime.now(KYIV_TZ),
     )
     pdf = HTML(string=html_string).write_pdf()
     bio = BytesIO(pdf)
@@ -884,8 +822,8 @@ def report_urgency():
         flash('Будь ласка, вкажіть обидві дати', 'warning')
         return redirect(url_for('records.index'))
     try:
-        from_d = datetime.strptime(from_str, '%Y-%m-%d').date()
-        to_d = datetime.strptime(to_str, '%Y-%m-%d').date()
+        from_d = date.fromisoformat(from_str)
+        to_d = date.fromisoformat(to_str)
     except ValueError:
         flash('Невірний формат дати', 'warning')
         return redirect(url_for('records.index'))
@@ -919,7 +857,6 @@ def report_urgency():
         func.sum(case((Record.is_urgent == True, 1), else_=0)).desc()
     ).all()
 
-    kyiv_tz = timezone(timedelta(hours=2))
     try:
         from weasyprint import HTML
     except ImportError:
@@ -936,7 +873,7 @@ def report_urgency():
         urgency_unset=urgency_row.unset or 0,
         urgency_by_dept=urgency_by_dept,
         generated_by=current_user.username,
-        generated_at=datetime.now(kyiv_tz),
+        generated_at=datetime.now(KYIV_TZ),
     )
     pdf = HTML(string=html_string).write_pdf()
     bio = BytesIO(pdf)
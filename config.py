@@ -13,6 +13,30 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(basedir, 'data', 'app.db')}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Для файлової SQLite SQLAlchemy 2.x і так бере QueuePool (5 + 10 overflow);
+    # тут лише обмежуємо overflow до 5 — gunicorn має 4 потоки, більше з'єднань
+    # не потрібно. Для :memory: Flask-SQLAlchemy сам ставить StaticPool.
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite:///') and ':memory:' not in SQLALCHEMY_DATABASE_URI:
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': 5,
+            'max_overflow': 5,
+        }
+    elif SQLALCHEMY_DATABASE_URI.startswith(('postgresql', 'postgres://')):
+        # Мережева БД через DATABASE_URL: pre_ping відсіює з'єднання, розірвані
+        # сервером/проксі за час простою, замість 500 на першому запиті після паузи
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_pre_ping': True,
+            'pool_size': 10,
+            'max_overflow': 20,
+        }
+
+    # Вартість bcrypt (2^N ітерацій). Flask-Bcrypt читає її в init_app; для
+    # тестів/dev можна знизити (4), слабкі хеші підвищуються при вході
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+
+    # Ліміт SQL-запитів на один HTTP-запит (0 — вимкнено); див. create_app
+    SQL_QUERY_BUDGET = int(os.environ.get('SQL_QUERY_BUDGET', 0))
+
     # Session cookie security
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
@@ -1,4 +1,8 @@
 """Application-wide constants."""
+from datetime import timedelta, timezone
+
+# Kyiv time as a fixed UTC+2 (DST ignored) — month boundaries and report timestamps
+KYIV_TZ = timezone(timedelta(hours=2))
 
 # User roles
 ROLE_ADMIN = 'admin'
@@ -8,7 +8,7 @@ from flask_login import current_user
 
 def role_required(*roles):
     """
-    Decorator to require specific role(s). Admin always has access unless explicitly excluded.
+    Decorator to require specific role(s). Admin always has access.
 
     Args:
         *roles: Variable number of role strings (e.g., 'operator', 'editor', 'admin', 'viewer')
@@ -21,16 +21,18 @@ def role_required(*roles):
         def admin_function():
             pass
     """
+    # admin has all rights — дозволені ролі збираються один раз при декоруванні,
+    # а не списком на кожен запит
+    allowed_roles = frozenset(roles) | {'admin'}
+
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if not current_user.is_authenticated:
+            # Розіменовуємо LocalProxy один раз замість кожного звернення до атрибута
+            user = current_user._get_current_object()
+            if not user.is_authenticated:
                 return redirect(url_for('auth.login'))
-            user_role = getattr(current_user, 'role', None)
-            # admin has all rights (unless roles explicitly exclude it)
-            allowed_roles = list(roles)
-            if 'admin' not in allowed_roles and user_role == 'admin':
-                allowed_roles.append('admin')
+            user_role = getattr(user, 'role', None)
             if user_role not in allowed_roles:
                 flash('Доступ заборонено', 'danger')
                 if user_role == 'ambulatory':
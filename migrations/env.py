@@ -7,6 +7,8 @@ from flask import current_app
 
 from alembic import context
 
+from models import HISTORY_FTS_TABLE
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -37,6 +39,18 @@ target_metadata = current_app.extensions['migrate'].db.metadata
 # ... etc.
 
 
+def include_name(name, type_, parent_names):
+    """Skip the FTS5 search index during autogenerate.
+
+    records_history_fts and its shadow tables (_data, _idx, _config,
+    _docsize) are created by raw SQL in 20261016_add_history_fts and are
+    not in the models' metadata, so autogenerate would propose dropping them.
+    """
+    if type_ == 'table' and name.startswith(HISTORY_FTS_TABLE):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -51,7 +65,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -83,6 +98,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_name=include_name,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -0,0 +1,26 @@
+"""Add (date, status) composite indexes to ambulatory_records and nszu_corrections
+
+Revision ID: 20261016_date_status_indexes
+Revises: 20261016_history_fts
+Create Date: 2026-10-16
+
+Both lists filter by a date range and count rows per status within it;
+same pattern as idx_record_date_status on records.
+"""
+from alembic import op
+
+
+revision = '20261016_date_status_indexes'
+down_revision = '20261016_history_fts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_amb_date_status', 'ambulatory_records', ['date', 'discharge_status'])
+    op.create_index('idx_nszu_date_status', 'nszu_corrections', ['date', 'status'])
+
+
+def downgrade():
+    op.drop_index('idx_nszu_date_status', table_name='nszu_corrections')
+    op.drop_index('idx_amb_date_status', table_name='ambulatory_records')
@@ -0,0 +1,28 @@
+"""Add partial index on records for the "has date of death" filter
+
+Revision ID: 20261016_deceased_index
+Revises: 20261016_date_status_indexes
+Create Date: 2026-10-16
+
+Only a small share of records have date_of_death set, so the dashboard's
+has_death_date list filter reads this index instead of scanning every record
+in the range or, with all_months, the whole table.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '20261016_deceased_index'
+down_revision = '20261016_date_status_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_record_deceased_date', 'records', ['date_of_discharge'],
+                    sqlite_where=sa.text('date_of_death IS NOT NULL'),
+                    postgresql_where=sa.text('date_of_death IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('idx_record_deceased_date', table_name='records')
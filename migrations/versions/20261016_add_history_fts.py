@@ -0,0 +1,49 @@
+"""Add FTS5 trigram index over records.history
+
+Revision ID: 20261016_history_fts
+Revises: 20260612_record_urgency
+Create Date: 2026-10-16
+
+External-content FTS5 table kept in sync by triggers; lets the dashboard
+history filter (substring of the case-history number) use an index instead
+of LIKE '%q%' over the whole records table. SQLite only.
+"""
+from alembic import op
+
+
+revision = '20261016_history_fts'
+down_revision = '20260612_record_urgency'
+branch_labels = None
+depends_on = None
+
+
+# Має збігатися з models.HISTORY_FTS_DDL
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS records_history_fts USING fts5("
+    "history, content='records', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS records_history_fts_ai AFTER INSERT ON records BEGIN "
+    "INSERT INTO records_history_fts(rowid, history) VALUES (new.id, new.history); END",
+    "CREATE TRIGGER IF NOT EXISTS records_history_fts_ad AFTER DELETE ON records BEGIN "
+    "INSERT INTO records_history_fts(records_history_fts, rowid, history) VALUES ('delete', old.id, old.history); END",
+    "CREATE TRIGGER IF NOT EXISTS records_history_fts_au AFTER UPDATE OF history ON records BEGIN "
+    "INSERT INTO records_history_fts(records_history_fts, rowid, history) VALUES ('delete', old.id, old.history); "
+    "INSERT INTO records_history_fts(rowid, history) VALUES (new.id, new.history); END",
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for ddl in FTS_DDL:
+        op.execute(ddl)
+    # Наповнити індекс наявними записами
+    op.execute("INSERT INTO records_history_fts(records_history_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER IF EXISTS records_history_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS records_history_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS records_history_fts_ai")
+    op.execute("DROP TABLE IF EXISTS records_history_fts")
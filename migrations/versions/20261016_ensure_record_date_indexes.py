@@ -0,0 +1,29 @@
+"""Ensure the (date_of_discharge, status/department) indexes on records exist
+
+Revision ID: 20261016_record_date_indexes
+Revises: 20261016_deceased_index
+Create Date: 2026-10-16
+
+20260330_add_composite_indexes creates them, but databases set up through
+the entrypoint (init-db + stamp head) before they were declared on the
+Record model never ran it. IF NOT EXISTS keeps this a no-op everywhere else.
+"""
+from alembic import op
+
+
+revision = '20261016_record_date_indexes'
+down_revision = '20261016_deceased_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE INDEX IF NOT EXISTS idx_record_date_status '
+               'ON records (date_of_discharge, discharge_status)')
+    op.execute('CREATE INDEX IF NOT EXISTS idx_record_date_dept '
+               'ON records (date_of_discharge, discharge_department)')
+
+
+def downgrade():
+    # Індекси належать 20260330_add_composite_indexes — тут їх не видаляємо
+    pass
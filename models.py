@@ -1,8 +1,9 @@
 from datetime import datetime, timezone
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import UserMixin
-from sqlalchemy import event
+from sqlalchemy import DDL, column, event, table
 
 # SQLAlchemy instance (init in app)
 db = SQLAlchemy()
@@ -41,11 +42,25 @@ def _set_sqlite_pragma(dbapi_conn, connection_record):
     cursor.close()
 
 
+def _optimize_sqlite_on_close(dbapi_conn, connection_record):
+    """Run PRAGMA optimize before a pooled SQLite connection is closed.
+
+    SQLite collects the planner hints for this while the connection runs
+    queries, so ANALYZE only touches tables whose statistics went stale.
+    """
+    try:
+        dbapi_conn.execute("PRAGMA optimize")
+    except Exception:
+        # з'єднання вже зламане/інвалідоване — закриваємо без оптимізації
+        pass
+
+
 def init_db_events(app):
     """Initialize database event listeners for SQLite optimizations."""
     if app.config.get('SQLALCHEMY_DATABASE_URI', '').startswith('sqlite'):
         with app.app_context():
             event.listen(db.engine, "connect", _set_sqlite_pragma)
+            event.listen(db.engine, "close", _optimize_sqlite_on_close)
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -56,13 +71,26 @@ class User(UserMixin, db.Model):
 
     records = db.relationship('Record', foreign_keys='Record.created_by', backref='creator', lazy=True)
 
-    def set_password(self, password):
+    @staticmethod
+    def hash_password(password):
+        """Return the bcrypt hash of password as a UTF-8 string."""
         # bcrypt returns bytes, store as decoded UTF-8 string
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        return bcrypt.generate_password_hash(password).decode('utf-8')
+
+    def set_password(self, password):
+        self.password_hash = self.hash_password(password)
 
     def check_password(self, password):
         return bcrypt.check_password_hash(self.password_hash, password)
 
+    def password_needs_rehash(self):
+        """True if the stored hash uses fewer bcrypt rounds than BCRYPT_LOG_ROUNDS."""
+        try:
+            cost = int(self.password_hash.split('$')[2])
+        except (AttributeError, IndexError, ValueError):
+            return False
+        return cost < current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
     def __repr__(self):
         return f"<User {self.username}>"
 
@@ -77,6 +105,16 @@ class Record(db.Model):
         db.Index('idx_record_updated_at', 'updated_at'),
         db.Index('idx_record_is_urgent', 'is_urgent'),
         db.Index('idx_record_history_submitted', 'history_submitted'),
+        # Складені під дашборд: діапазон date_of_discharge + статус/відділення,
+        # сортування date_of_discharge (міграції 20260330_add_composite_indexes,
+        # 20261016_record_date_indexes)
+        db.Index('idx_record_date_status', 'date_of_discharge', 'discharge_status'),
+        db.Index('idx_record_date_dept', 'date_of_discharge', 'discharge_department'),
+        # Частковий: фільтр «з датою смерті» — лише невелика частка записів
+        # (міграція 20261016_deceased_index)
+        db.Index('idx_record_deceased_date', 'date_of_discharge',
+                 sqlite_where=db.text('date_of_death IS NOT NULL'),
+                 postgresql_where=db.text('date_of_death IS NOT NULL')),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -104,6 +142,32 @@ class Record(db.Model):
         return f"<Record {self.id} {self.full_name}>"
 
 
+# FTS5-індекс (trigram) над records.history: пошук підрядка номера історії
+# йде індексом, а не LIKE '%q%' по всій таблиці. External content — текст не
+# дублюється, синхронізацію тримають тригери. DDL має збігатися з міграцією
+# 20261016_history_fts. Увага: batch_alter_table('records') у SQLite
+# перестворює таблицю і губить тригери — у такій міграції створити їх знову.
+HISTORY_FTS_TABLE = 'records_history_fts'
+HISTORY_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {HISTORY_FTS_TABLE} USING fts5("
+    f"history, content='records', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {HISTORY_FTS_TABLE}_ai AFTER INSERT ON records BEGIN "
+    f"INSERT INTO {HISTORY_FTS_TABLE}(rowid, history) VALUES (new.id, new.history); END",
+    f"CREATE TRIGGER IF NOT EXISTS {HISTORY_FTS_TABLE}_ad AFTER DELETE ON records BEGIN "
+    f"INSERT INTO {HISTORY_FTS_TABLE}({HISTORY_FTS_TABLE}, rowid, history) VALUES ('delete', old.id, old.history); END",
+    f"CREATE TRIGGER IF NOT EXISTS {HISTORY_FTS_TABLE}_au AFTER UPDATE OF history ON records BEGIN "
+    f"INSERT INTO {HISTORY_FTS_TABLE}({HISTORY_FTS_TABLE}, rowid, history) VALUES ('delete', old.id, old.history); "
+    f"INSERT INTO {HISTORY_FTS_TABLE}(rowid, history) VALUES (new.id, new.history); END",
+)
+history_fts = table(HISTORY_FTS_TABLE, column('rowid'), column('history'))
+
+# db.create_all()/drop_all() (init-db, тести) ведуть FTS разом з records
+for _ddl in HISTORY_FTS_DDL:
+    event.listen(Record.__table__, 'after_create', DDL(_ddl).execute_if(dialect='sqlite'))
+event.listen(Record.__table__, 'before_drop',
+             DDL(f'DROP TABLE IF EXISTS {HISTORY_FTS_TABLE}').execute_if(dialect='sqlite'))
+
+
 class Audit(db.Model):
     __tablename__ = 'audit_logs'
     id = db.Column(db.Integer, primary_key=True)
@@ -219,6 +283,9 @@ class NSZUCorrection(db.Model):
         db.Index('idx_nszu_created_at', 'created_at'),
         db.Index('idx_nszu_record_id', 'nszu_record_id'),
         db.Index('idx_nszu_date', 'date'),
+        # Діапазон date + GROUP BY status для статистики списку
+        # (міграція 20261016_date_status_indexes)
+        db.Index('idx_nszu_date_status', 'date', 'status'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -251,6 +318,9 @@ class AmbulatoryRecord(db.Model):
         db.Index('idx_amb_date', 'date'),
         db.Index('idx_amb_full_name', 'full_name'),
         db.Index('idx_amb_updated_at', 'updated_at'),
+        # Діапазон date + статус: фільтр і GROUP BY лічильників списку
+        # (міграція 20261016_date_status_indexes)
+        db.Index('idx_amb_date_status', 'date', 'discharge_status'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
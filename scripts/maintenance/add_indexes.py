@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 """
 Міграційний скрипт для додавання індексів до існуючої бази даних.
-Виконати: python add_indexes.py
+Виконати: python add_indexes.py [--vacuum]
 """
+import argparse
 import sqlite3
 import os
 from datetime import datetime
@@ -25,18 +26,28 @@ def create_backup():
         # Створюємо директорію backups якщо не існує
         os.makedirs(os.path.join(db_dir, 'backups'), exist_ok=True)
 
-        import shutil
-        shutil.copy2(DB_PATH, backup_path)
+        # Online Backup API замість shutil.copy2: копія файлу при WAL може бути
+        # «розірваною» (свіжі сторінки ще в -wal), backup() читає через pager.
+        # Один крок (pages=-1 за замовчуванням): покроковий backup SQLite
+        # перезапускає після кожного запису з іншого з'єднання, тож проти
+        # робочого додатку міг би не завершитись; у WAL-режимі писачів не блокує
+        src = sqlite3.connect(DB_PATH)
+        dst = sqlite3.connect(backup_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
         print(f"✓ Створено резервну копію: {backup_path}")
         return backup_path
     return None
 
-def check_index_exists(cursor, index_name):
-    """Перевіряє чи існує індекс"""
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name=?", (index_name,))
-    return cursor.fetchone() is not None
+def get_existing_indexes(cursor):
+    """Повертає множину імен усіх індексів БД (один запит до sqlite_master)"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    return {row[0] for row in cursor.fetchall()}
 
-def add_indexes():
+def add_indexes(vacuum=False):
     """Додає індекси до існуючої бази даних"""
     if not os.path.exists(DB_PATH):
         print(f"⚠ База даних {DB_PATH} не знайдена!")
@@ -48,6 +59,13 @@ def add_indexes():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
+    # Ті самі PRAGMA, що й у додатку (models._set_sqlite_pragma): WAL дозволяє
+    # живому додатку читати, поки скрипт будує індекси
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")
+
     # Список індексів для створення
     indexes = [
         # Індекси для таблиці records
@@ -57,6 +75,19 @@ def add_indexes():
         ("idx_record_date_of_discharge", "CREATE INDEX IF NOT EXISTS idx_record_date_of_discharge ON records(date_of_discharge)"),
         ("idx_record_full_name", "CREATE INDEX IF NOT EXISTS idx_record_full_name ON records(full_name)"),
         ("idx_record_updated_at", "CREATE INDEX IF NOT EXISTS idx_record_updated_at ON records(updated_at)"),
+        ("idx_record_is_urgent", "CREATE INDEX IF NOT EXISTS idx_record_is_urgent ON records(is_urgent)"),
+        ("idx_record_history_submitted", "CREATE INDEX IF NOT EXISTS idx_record_history_submitted ON records(history_submitted)"),
+
+        # Складені індекси під дашборд (records.index): фільтр за діапазоном
+        # date_of_discharge + статус/відділення, сортування date_of_discharge DESC
+        ("idx_record_date_status", "CREATE INDEX IF NOT EXISTS idx_record_date_status ON records(date_of_discharge, discharge_status)"),
+        ("idx_record_date_dept", "CREATE INDEX IF NOT EXISTS idx_record_date_dept ON records(date_of_discharge, discharge_department)"),
+        # Частковий під фільтр «з датою смерті»: індексуються лише такі записи
+        ("idx_record_deceased_date", "CREATE INDEX IF NOT EXISTS idx_record_deceased_date ON records(date_of_discharge) WHERE date_of_death IS NOT NULL"),
+
+        # Те саме для амбулаторних записів і корекцій НСЗУ: діапазон date + статус
+        ("idx_amb_date_status", "CREATE INDEX IF NOT EXISTS idx_amb_date_status ON ambulatory_records(date, discharge_status)"),
+        ("idx_nszu_date_status", "CREATE INDEX IF NOT EXISTS idx_nszu_date_status ON nszu_corrections(date, status)"),
 
         # Індекс для таблиці users (якщо не існує через unique=True)
         ("idx_users_username", "CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)"),
@@ -71,8 +102,13 @@ def add_indexes():
     created_count = 0
     skipped_count = 0
 
+    existing = get_existing_indexes(cursor)
+
+    # Усі CREATE INDEX в одній транзакції — один коміт (і fsync) на весь набір.
+    # Помилка окремого індексу відкочує лише свою інструкцію, не транзакцію
+    cursor.execute("BEGIN")
     for index_name, create_sql in indexes:
-        if check_index_exists(cursor, index_name):
+        if index_name in existing:
             print(f"⊘ {index_name:<40} (вже існує)")
             skipped_count += 1
         else:
@@ -86,9 +122,12 @@ def add_indexes():
     # Оптимізація БД після створення індексів
     print("\n🔧 Оптимізація бази даних...")
     cursor.execute("ANALYZE")
-    cursor.execute("VACUUM")
-
     conn.commit()
+    if vacuum:
+        # VACUUM переписує весь файл під ексклюзивним локом — живий додаток
+        # стоїть увесь цей час, тому лише за явним --vacuum (офлайн-обслуговування)
+        cursor.execute("VACUUM")
+
     conn.close()
 
     print("=" * 60)
@@ -114,7 +153,12 @@ def add_indexes():
     conn.close()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Додавання індексів до БД')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='виконати VACUUM після ANALYZE (блокує БД, лише офлайн)')
+    args = parser.parse_args()
+
     print("=" * 60)
     print("   ДОДАВАННЯ ІНДЕКСІВ ДЛЯ ОПТИМІЗАЦІЇ ПРОДУКТИВНОСТІ")
     print("=" * 60)
-    add_indexes()
+    add_indexes(vacuum=args.vacuum)
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 """
-Database ANALYZE script for optimizing query planner statistics.
+Database statistics refresh for the query planner (PRAGMA optimize).
 
 This script should be run periodically (e.g., daily via cron) to keep
-the database query planner statistics up-to-date.
+the database query planner statistics up-to-date. Unlike a full ANALYZE
+it only re-analyzes tables whose statistics are missing or stale; pooled
+connections in the app run the same PRAGMA when they are closed.
 
 Usage:
     python analyze_db.py
@@ -15,25 +17,33 @@ Cron example (run daily at 3 AM):
     0 3 * * * cd /path/to/app && python analyze_db.py >> logs/analyze.log 2>&1
 """
 
+import sqlite3
 import sys
 from datetime import datetime
 
 
 def analyze_database():
-    """Run ANALYZE on the database to update query planner statistics."""
+    """Run PRAGMA optimize (ANALYZE where unavailable) to update query planner statistics."""
     try:
         from app import create_app
         from models import db
 
         app = create_app()
         with app.app_context():
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Starting ANALYZE...")
-
-            # Run ANALYZE to update statistics
-            db.session.execute(db.text("ANALYZE"))
+            # 0x10002: звичайна маска optimize + перевірка всіх таблиць, а не лише
+            # тих, що запитувались у цьому (щойно відкритому) з'єднанні.
+            # Біт 0x10000 з'явився в SQLite 3.46 — на старіших SQLite і на
+            # PostgreSQL (DATABASE_URL) лишається ANALYZE
+            if db.engine.dialect.name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 46, 0):
+                stmt = "PRAGMA optimize=0x10002"
+            else:
+                stmt = "ANALYZE"
+
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Starting {stmt}...")
+            db.session.execute(db.text(stmt))
             db.session.commit()
 
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ANALYZE completed successfully")
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {stmt} completed successfully")
             return 0
 
     except Exception as e:
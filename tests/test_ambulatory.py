@@ -1,4 +1,5 @@
 import pytest
+import re
 from app import create_app
 from models import db, User, AmbulatoryRecord, StatusOption, seed_ambulatory_statuses
 from datetime import date
@@ -252,3 +253,28 @@ def test_is_urgent_ambulatory_record(app, client):
         db.session.refresh(r)
         assert r.is_urgent is False
 
+
+def test_ambulatory_list_stat_counters(app, client):
+    with app.app_context():
+        op = ensure_user('ed_user', role='editor')
+        d = date(2026, 5, 10)
+        common = dict(date=d, full_name='Пацієнт', birth_date=date(1990, 1, 1), doctor='Д-р Лікар',
+                      diagnosis='ГРВІ', created_by=op.id)
+        db.session.add_all([
+            AmbulatoryRecord(journal_number='1/A', discharge_status='Виписаний', is_urgent=True, **common),
+            AmbulatoryRecord(journal_number='2/A', discharge_status='Виписаний', **common),
+            AmbulatoryRecord(journal_number='3/A', discharge_status='Епізод відсутній', is_urgent=True, **common),
+            AmbulatoryRecord(journal_number='4/A', discharge_status='Статус-привид', **common),
+            AmbulatoryRecord(journal_number='5/A', discharge_status='Виписаний',
+                             **{**common, 'date': date(2026, 6, 1)}),
+        ])
+        db.session.commit()
+        client.post('/login', data={'username': 'ed_user', 'password': 'password123'}, follow_redirects=True)
+
+        html = client.get('/ambulatory/?month_filter=2026-05').get_data(as_text=True)
+        pills = dict(re.findall(r'([А-ЯІЇЄҐа-яіїєґ][А-ЯІЇЄҐа-яіїєґ ]*): <strong>(\d+)</strong>', html))
+        assert pills['Всього'] == '4'
+        assert pills['Виписаний'] == '2'
+        assert pills['Епізод відсутній'] == '1'
+        assert pills['Ургентних станів'] == '2'
+        assert pills['Інше'] == '1'
@@ -0,0 +1,108 @@
+import pytest
+from app import create_app
+from models import db, bcrypt
+from models import User
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        yield app.test_client()
+
+
+def test_login_upgrades_weak_password_hash(app, client, monkeypatch):
+    # Вартість на 1 вище за мінімум bcrypt (4), щоб «слабкий» хеш був можливий
+    # і при BCRYPT_LOG_ROUNDS=4 у CI; Flask-Bcrypt читає її лише в init_app
+    monkeypatch.setitem(app.config, 'BCRYPT_LOG_ROUNDS', 5)
+    monkeypatch.setattr(bcrypt, '_log_rounds', 5)
+    with app.app_context():
+        u = User(username='legacy', role='editor')
+        u.password_hash = bcrypt.generate_password_hash('pass', rounds=4).decode('utf-8')
+        db.session.add(u)
+        db.session.commit()
+        assert u.password_needs_rehash()
+
+        client.post('/login', data={'username': 'legacy', 'password': 'pass'}, follow_redirects=True)
+
+        u = db.session.get(User, u.id)
+        assert int(u.password_hash.split('$')[2]) == 5
+        assert not u.password_needs_rehash()
+        assert u.check_password('pass')
+
+
+def test_failed_login_keeps_hash(app, client):
+    with app.app_context():
+        u = User(username='legacy2', role='editor')
+        u.password_hash = bcrypt.generate_password_hash('pass', rounds=4).decode('utf-8')
+        db.session.add(u)
+        db.session.commit()
+        old_hash = u.password_hash
+
+        client.post('/login', data={'username': 'legacy2', 'password': 'wrong'}, follow_redirects=True)
+
+        db.session.expire_all()
+        assert db.session.get(User, u.id).password_hash == old_hash
+
+
+def test_admin_create_user_stores_hash_and_audit(app, client):
+    from models import Audit
+    with app.app_context():
+        admin = User(username='root', role='admin')
+        admin.set_password('adminpass')
+        db.session.add(admin)
+        db.session.commit()
+
+        client.post('/login', data={'username': 'root', 'password': 'adminpass'}, follow_redirects=True)
+        client.post('/admin/users/create', data={'username': 'newop', 'password': 'newpass123', 'role': 'operator'},
+                    follow_redirects=True)
+
+        u = db.session.execute(db.select(User).filter_by(username='newop')).scalar_one()
+        assert u.role == 'operator'
+        assert u.check_password('newpass123')
+        assert db.session.execute(
+            db.select(Audit).filter_by(action='user.create', target_id=u.id)
+        ).scalar_one_or_none() is not None
+
+
+def test_admin_create_user_duplicate_username(app, client):
+    with app.app_context():
+        admin = User(username='root', role='admin')
+        admin.set_password('adminpass')
+        db.session.add(admin)
+        db.session.commit()
+
+        client.post('/login', data={'username': 'root', 'password': 'adminpass'}, follow_redirects=True)
+        rv = client.post('/admin/users/create', data={'username': 'root', 'password': 'otherpass1', 'role': 'viewer'},
+                         follow_redirects=True)
+
+        assert 'вже зайнято' in rv.get_data(as_text=True)
+        assert db.session.execute(db.select(db.func.count(User.id))).scalar() == 1
+        assert db.session.get(User, admin.id).check_password('adminpass')
+
+
+def test_user_map_refreshed_after_rename(app, client):
+    from utils import get_user_map
+    with app.app_context():
+        admin = User(username='root', role='admin')
+        admin.set_password('adminpass')
+        op = User(username='oldname', role='operator')
+        op.set_password('operator1')
+        db.session.add_all([admin, op])
+        db.session.commit()
+
+        client.post('/login', data={'username': 'root', 'password': 'adminpass'}, follow_redirects=True)
+        assert get_user_map()[op.id] == 'oldname'
+        client.post(f'/admin/users/{op.id}/edit', data={'username': 'newname', 'password': '', 'role': 'operator'})
+
+        assert get_user_map()[op.id] == 'newname'
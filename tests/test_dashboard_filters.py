@@ -89,3 +89,141 @@ def test_month_year_filter(app, client):
         txt = rv.get_data(as_text=True)
         assert 'Jan Record' in txt
         assert 'Now Record' not in txt
+
+
+def test_history_filter_substring(app, client):
+    with app.app_context():
+        ensure_user('ed', role='editor')
+        ensure_department()
+        u = User.query.filter_by(username='ed').first()
+
+        today = datetime.date.today()
+        r_match = Record(date_of_discharge=today, full_name='Match Record', discharge_department='DeptTest', treating_physician='Dr', history='12345/26', k_days=1, created_by=u.id)
+        r_other = Record(date_of_discharge=today, full_name='Other Record', discharge_department='DeptTest', treating_physician='Dr', history='777/26', k_days=1, created_by=u.id)
+        r_renamed = Record(date_of_discharge=today, full_name='Renamed Record', discharge_department='DeptTest', treating_physician='Dr', history='999/26', k_days=1, created_by=u.id)
+        db.session.add_all([r_match, r_other, r_renamed])
+        db.session.commit()
+        # індекс історії має відстежувати зміну номера
+        r_renamed.history = '2345-A'
+        db.session.commit()
+
+        client.post('/login', data={'username': 'ed', 'password': 'pass'}, follow_redirects=True)
+        txt = client.get('/', query_string={'history': '234'}).get_data(as_text=True)
+        assert 'Match Record' in txt
+        assert 'Renamed Record' in txt
+        assert 'Other Record' not in txt
+
+        # короткий запит (менше 3 символів) — через LIKE
+        txt = client.get('/', query_string={'history': '77'}).get_data(as_text=True)
+        assert 'Other Record' in txt
+        assert 'Match Record' not in txt
+
+
+def test_dashboard_query_budget(app, client):
+    with app.app_context():
+        ensure_user('ed', role='editor')
+        ensure_department()
+        u = User.query.filter_by(username='ed').first()
+        today = datetime.date.today()
+        db.session.add_all([
+            Record(date_of_discharge=today, full_name=f'Budget {i}', discharge_department='DeptTest',
+                   treating_physician='Dr', history=f'B{i}', k_days=1, created_by=u.id, updated_by=u.id)
+            for i in range(30)
+        ])
+        db.session.commit()
+
+        client.post('/login', data={'username': 'ed', 'password': 'pass'}, follow_redirects=True)
+        # кількість запитів не повинна рости з кількістю записів (N+1)
+        app.config['SQL_QUERY_BUDGET'] = 20
+        rv = client.get('/')
+        assert rv.status_code == 200
+        assert 'Budget 29' in rv.get_data(as_text=True)
+
+
+def test_record_dropdowns_match_distinct_helpers(app):
+    from utils import (clear_dropdown_cache, get_record_dropdowns, get_distinct_statuses,
+                       get_distinct_physicians, get_distinct_departments)
+    with app.app_context():
+        db.session.add_all([
+            Record(full_name='A', discharge_status='Виписаний', treating_physician='Шевченко',
+                   discharge_department='Хірургія'),
+            Record(full_name='B', discharge_status='Опрацьовується', treating_physician='Антоненко',
+                   discharge_department='Хірургія'),
+            Record(full_name='C', discharge_status=None, treating_physician=None, discharge_department='Терапія'),
+        ])
+        db.session.commit()
+        clear_dropdown_cache()
+
+        statuses, physicians, departments = get_record_dropdowns()
+        assert statuses == ['Виписаний', 'Опрацьовується']
+        assert physicians == ['Антоненко', 'Шевченко']
+        assert departments == ['Терапія', 'Хірургія']
+
+        clear_dropdown_cache()
+        assert (get_distinct_statuses(), get_distinct_physicians(), get_distinct_departments()) == \
+            (statuses, physicians, departments)
+
+
+def test_add_form_departments_follow_admin_changes(app, client):
+    with app.app_context():
+        ensure_user('adm', role='admin')
+        ensure_department('Кардіологія')
+        client.post('/login', data={'username': 'adm', 'password': 'pass'}, follow_redirects=True)
+
+        rv = client.get('/records/add')
+        assert 'value="Кардіологія"' in rv.get_data(as_text=True)
+
+        client.post('/admin/departments/create', data={'name': 'Неврологія'})
+        rv = client.get('/records/add')
+        assert 'value="Неврологія"' in rv.get_data(as_text=True)
+
+        d = Department.query.filter_by(name='Кардіологія').first()
+        client.post(f'/admin/departments/{d.id}/delete')
+        rv = client.get('/records/add')
+        assert 'value="Кардіологія"' not in rv.get_data(as_text=True)
+
+
+def test_dashboard_stat_counters(app, client):
+    import re
+    with app.app_context():
+        ensure_user('ed', role='editor')
+        client.post('/login', data={'username': 'ed', 'password': 'pass'}, follow_redirects=True)
+        d = datetime.date(2026, 5, 10)
+        db.session.add_all([
+            Record(full_name='A', date_of_discharge=d, discharge_status='Виписаний', is_urgent=True,
+                   history_submitted=True),
+            Record(full_name='B', date_of_discharge=d, discharge_status='Виписаний', date_of_death=d),
+            Record(full_name='C', date_of_discharge=d, discharge_status='Опрацьовується', is_urgent=True),
+            Record(full_name='D', date_of_discharge=d, discharge_status='Порушені вимоги', is_urgent=False),
+            Record(full_name='E', date_of_discharge=datetime.date(2026, 6, 1), discharge_status='Виписаний'),
+        ])
+        db.session.commit()
+
+        html = client.get('/?month_filter=2026-05&per_page=10').get_data(as_text=True)
+        pills = dict(re.findall(r'([А-ЯІЇЄҐа-яіїєґ][А-ЯІЇЄҐа-яіїєґ ]*): <strong>(\d+)</strong>', html))
+        assert pills['Всього'] == '4'
+        assert pills['Виписаних'] == '1'
+        assert pills['Опрацьовується'] == '1'
+        assert pills['Порушення'] == '1'
+        assert pills['Померло'] == '1'
+        assert (pills['Ургентних'], pills['Планових']) == ('2', '1')
+        assert (pills['Здано'], pills['Не здано']) == ('1', '3')
+
+
+def test_dashboard_extra_status_pill_counts(app, client):
+    from models import StatusOption
+    with app.app_context():
+        ensure_user('ed', role='editor')
+        db.session.add(StatusOption(scope='records', name='На дообстеженні', color='info', icon='bi-search',
+                                    sort_order=50, show_in_stats=True, is_system=False))
+        d = datetime.date(2026, 5, 10)
+        db.session.add_all([
+            Record(full_name='A', date_of_discharge=d, discharge_status='На дообстеженні'),
+            Record(full_name='B', date_of_discharge=d, discharge_status='На дообстеженні'),
+            Record(full_name='C', date_of_discharge=d, discharge_status='На дообстеженні', date_of_death=d),
+        ])
+        db.session.commit()
+        client.post('/login', data={'username': 'ed', 'password': 'pass'}, follow_redirects=True)
+
+        html = client.get('/?month_filter=2026-05').get_data(as_text=True)
+        assert 'На дообстеженні: <strong>2</strong>' in html
@@ -0,0 +1,136 @@
+import pytest
+from io import BytesIO
+from datetime import date
+from decimal import Decimal
+from openpyxl import load_workbook
+from app import create_app
+from models import db, User, Record, AmbulatoryRecord, NSZUCorrection
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        yield app.test_client()
+
+
+def login(client, username, role):
+    u = User(username=username, role=role)
+    u.set_password('password123')
+    db.session.add(u)
+    db.session.commit()
+    client.post('/login', data={'username': username, 'password': 'password123'}, follow_redirects=True)
+    return u
+
+
+def read_sheet(rv):
+    assert rv.status_code == 200
+    assert rv.content_length == len(rv.data)
+    wb = load_workbook(BytesIO(rv.data))
+    return list(wb.active.iter_rows(values_only=True)), wb.active
+
+
+def test_records_export_editor_columns(app, client):
+    with app.app_context():
+        u = login(client, 'ed', 'editor')
+        db.session.add_all([
+            Record(date_of_discharge=date(2026, 5, 3), full_name='Петренко Петро', history='H-1',
+                   k_days=4, suma=Decimal('12500'), created_by=u.id),
+            Record(date_of_discharge=date(2026, 5, 20), full_name='Іваненко Іван', history='H-2', k_days=2),
+            Record(date_of_discharge=date(2026, 6, 1), full_name='Поза місяцем', history='H-3'),
+        ])
+        db.session.commit()
+
+        rv = client.post('/export', data={'export_mode': 'month', 'month_filter': '2026-05'})
+        rows, ws = read_sheet(rv)
+
+        assert rows[0][:3] == ('ID', 'Дата виписки', 'ПІБ')
+        assert len(rows[0]) == 16
+        assert [r[2] for r in rows[1:]] == ['Іваненко Іван', 'Петренко Петро']
+        assert rows[2][9] == '12 500'
+        assert rows[2][14] == 'ed'
+        assert ws['A1'].font.bold
+        # XlsxWriter зберігає ширину так само, як Excel: з відступом комірки (+0.71)
+        assert int(ws.column_dimensions['C'].width) == len('Петренко Петро') + 2
+        assert ws['A1'].fill.fgColor.rgb.endswith('366092')
+
+
+def test_records_export_viewer_restricted_columns(app, client):
+    with app.app_context():
+        login(client, 'vw', 'viewer')
+        db.session.add(Record(date_of_discharge=date(2026, 5, 3), full_name='Петренко Петро', history='H-1'))
+        db.session.commit()
+
+        rv = client.post('/export', data={'export_mode': 'range', 'from_date': '2026-05-01', 'to_date': '2026-05-31'})
+        rows, _ = read_sheet(rv)
+
+        assert len(rows[0]) == 8
+        assert rows[1][2] == 'Петренко Петро'
+
+
+def test_ambulatory_export(app, client):
+    with app.app_context():
+        login(client, 'ed', 'editor')
+        db.session.add(AmbulatoryRecord(journal_number='1/A', date=date(2026, 5, 3), full_name='Коваль Олена',
+                                        birth_date=date(1990, 1, 1), doctor='Д-р Петров', diagnosis='ГРВІ'))
+        db.session.commit()
+
+        rv = client.post('/ambulatory/export', data={'export_mode': 'month', 'month_filter': '2026-05'})
+        rows, _ = read_sheet(rv)
+
+        assert rows[0][1] == 'Номер у журналі'
+        assert rows[1][1:4] == ('1/A', '03.05.2026', 'Коваль Олена')
+
+
+def test_nszu_export_sum_format(app, client):
+    with app.app_context():
+        login(client, 'ed', 'editor')
+        db.session.add(NSZUCorrection(date=date(2026, 5, 3), nszu_record_id='abc-123', doctor='Д-р Петров',
+                                      fakt_summ=Decimal('150.5')))
+        db.session.commit()
+
+        rv = client.post('/nszu/export', data={'from_date': '2026-05-01', 'to_date': '2026-05-31'})
+        rows, ws = read_sheet(rv)
+
+        assert rows[1][2] == 'abc-123'
+        assert rows[1][6] == 150.5
+        assert ws['G2'].number_format == '0.00'
+
+
+def test_records_export_empty_redirects(app, client):
+    with app.app_context():
+        login(client, 'ed', 'editor')
+        rv = client.post('/export', data={'export_mode': 'month', 'month_filter': '2026-05'})
+        assert rv.status_code == 302
+
+
+def test_records_export_history_filter(app, client):
+    with app.app_context():
+        login(client, 'ed', 'editor')
+        db.session.add_all([
+            Record(date_of_discharge=date(2026, 5, 3), full_name='Перший', history='2026/1234'),
+            Record(date_of_discharge=date(2026, 5, 4), full_name='Другий', history='2026/5678'),
+        ])
+        db.session.commit()
+
+        rv = client.post('/export', data={'export_mode': 'month', 'month_filter': '2026-05', 'history': '123'})
+        rows, _ = read_sheet(rv)
+
+        assert [r[2] for r in rows[1:]] == ['Перший']
+
+
+def test_nszu_export_empty_redirects(app, client):
+    with app.app_context():
+        login(client, 'ed', 'editor')
+        rv = client.post('/nszu/export', data={'from_date': '2026-05-01', 'to_date': '2026-05-31'})
+        assert rv.status_code == 302
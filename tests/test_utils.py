@@ -0,0 +1,21 @@
+import datetime
+
+from utils import parse_date
+
+
+def test_parse_date_ukrainian_and_iso_formats():
+    assert parse_date('31.12.2023') == datetime.date(2023, 12, 31)
+    assert parse_date('2023-12-31') == datetime.date(2023, 12, 31)
+    # strptime приймав одноцифрові день/місяць — зберігаємо поведінку
+    assert parse_date('1.2.2024') == datetime.date(2024, 2, 1)
+    assert parse_date('  05.03.2024 ') == datetime.date(2024, 3, 5)
+
+
+def test_parse_date_rejects_invalid_input():
+    default = datetime.date(2000, 1, 1)
+    assert parse_date('31.02.2023') is None
+    assert parse_date('2023/12/31') is None
+    assert parse_date('31.12.23') is None
+    assert parse_date('2023-12-31x') is None
+    assert parse_date('') is None
+    assert parse_date('garbage', default=default) == default
@@ -1,8 +1,11 @@
 """
 Utility functions for the application.
 """
-from datetime import datetime, date
-from typing import Optional
+import re
+import tempfile
+from datetime import date
+from functools import lru_cache
+from typing import Iterable, Optional
 from urllib.parse import urlparse
 
 
@@ -26,8 +29,42 @@ def escape_like(value: str) -> str:
     return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
 
 
+def history_search_condition(history_q: str):
+    """
+    SQL condition for a substring search in Record.history.
+
+    On SQLite, queries of 3+ characters without LIKE wildcards go through the
+    records_history_fts trigram index; anything else falls back to LIKE '%q%'.
+    """
+    from sqlalchemy import select
+    from models import Record, db, history_fts
+    if (len(history_q) >= 3 and not any(ch in history_q for ch in '%_\\')
+            and db.engine.dialect.name == 'sqlite'):
+        return Record.id.in_(select(history_fts.c.rowid)
+                             .where(history_fts.c.history.like(f'%{history_q}%')))
+    return Record.history.like(f'%{escape_like(history_q)}%', escape='\\')
+
+
+def preserved_filters(form, keys, prefix='', flags=()) -> dict:
+    """
+    Collect list filters posted back with a form into redirect params.
+
+    Text filters keep their stripped non-empty value; flags (checkbox-like
+    filters) become '1' when present. Form fields are looked up as prefix + key.
+    """
+    params = {}
+    for k in keys:
+        v = form.get(prefix + k, '').strip()
+        if v:
+            params[k] = v
+    for k in flags:
+        if form.get(prefix + k, '').strip():
+            params[k] = '1'
+    return params
+
+
 def get_user_map():
-    """Return cached {user_id: username} mapping. Cleared together with dropdown cache."""
+    """Return cached {user_id: username} mapping. Cleared by clear_user_map_cache() on user changes."""
     try:
         from app.extensions import cache
         cached = cache.get('_user_map')
@@ -42,6 +79,20 @@ def get_user_map():
         return {u.id: u.username for u in User.query.all()}
 
 
+def username_exists(username: str, exclude_id: Optional[int] = None) -> bool:
+    """Check whether a username is taken (optionally by a user other than exclude_id).
+
+    Runs SELECT EXISTS over the unique username index instead of loading the
+    full User row (with its password hash) just to test for presence.
+    """
+    from sqlalchemy import exists
+    from models import User, db
+    cond = User.username == username
+    if exclude_id is not None:
+        cond = cond & (User.id != exclude_id)
+    return db.session.query(exists().where(cond)).scalar()
+
+
 def validate_record_form(form_data: dict, require_status_and_dept: bool = False) -> tuple:
     """
     Validate record form data shared across add/edit routes.
@@ -118,54 +169,130 @@ def validate_record_form(form_data: dict, require_status_and_dept: bool = False)
     }, None
 
 
+# Кеш значень для фільтрів дашбордів. Їх змінюють лише записи records/ambulatory,
+# тому після запису видаляємо тільки ці ключі, а не весь кеш
+_DISTINCT_CACHE_KEYS = ('_distinct_statuses', '_distinct_physicians',
+                        '_distinct_departments', '_distinct_ambulatory_doctors')
+
+
+def _cached_distinct(cache_key, column):
+    """Return sorted distinct non-null values of column, cached under cache_key."""
+    from app.extensions import cache
+    from models import db
+    values = cache.get(cache_key)
+    if values is None:
+        values = [v[0] for v in db.session.query(column).distinct()
+                  .filter(column != None)
+                  .order_by(column).all()]
+        cache.set(cache_key, values, timeout=900)
+    return values
+
+
 def get_distinct_statuses():
     """Get distinct discharge statuses from database (cached)."""
-    from app.extensions import cache
-    from models import Record, db
-    @cache.memoize(timeout=900)
-    def _inner():
-        return [s[0] for s in db.session.query(Record.discharge_status).distinct()
-                .filter(Record.discharge_status != None)
-                .order_by(Record.discharge_status).all()]
-    return _inner()
+    from models import Record
+    return _cached_distinct('_distinct_statuses', Record.discharge_status)
 
 
 def get_distinct_physicians():
     """Get distinct treating physicians from database (cached)."""
-    from app.extensions import cache
-    from models import Record, db
-    @cache.memoize(timeout=900)
-    def _inner():
-        return [p[0] for p in db.session.query(Record.treating_physician).distinct()
-                .filter(Record.treating_physician != None)
-                .order_by(Record.treating_physician).all()]
-    return _inner()
+    from models import Record
+    return _cached_distinct('_distinct_physicians', Record.treating_physician)
 
 
 def get_distinct_departments():
     """Get distinct discharge departments from database (cached)."""
+    from models import Record
+    return _cached_distinct('_distinct_departments', Record.discharge_department)
+
+
+def get_record_dropdowns() -> tuple:
+    """
+    Get (statuses, physicians, departments) for the dashboard filters (cached).
+
+    Served from the same cache keys as the get_distinct_* helpers; on a miss
+    all three lists are reloaded with one UNION ALL query instead of three
+    separate SELECT DISTINCTs.
+    """
+    from sqlalchemy import literal, select, union_all
     from app.extensions import cache
     from models import Record, db
-    @cache.memoize(timeout=900)
-    def _inner():
-        return [d[0] for d in db.session.query(Record.discharge_department).distinct()
-                .filter(Record.discharge_department != None)
-                .order_by(Record.discharge_department).all()]
-    return _inner()
+    keys = ('_distinct_statuses', '_distinct_physicians', '_distinct_departments')
+    cached = cache.get_many(*keys)
+    if all(v is not None for v in cached):
+        return tuple(cached)
+
+    columns = (Record.discharge_status, Record.treating_physician, Record.discharge_department)
+    parts = [select(literal(i).label('k'), col.label('v')).where(col != None).distinct()
+             for i, col in enumerate(columns)]
+    buckets = ([], [], [])
+    for k, v in db.session.execute(union_all(*parts)):
+        buckets[k].append(v)
+    # BINARY-колація SQLite = порядок кодових точок, як і sorted() для str
+    values = tuple(sorted(b) for b in buckets)
+    cache.set_many(dict(zip(keys, values)), timeout=900)
+    return values
+
+
+def get_departments():
+    """
+    Get the department dictionary as [{'id', 'name'}] ordered by name (cached).
+
+    Changes only through the admin department routes, which call
+    clear_department_cache().
+    """
+    from app.extensions import cache
+    from models import Department, db
+    departments = cache.get('_departments')
+    if departments is None:
+        departments = [{'id': d_id, 'name': name} for d_id, name in
+                       db.session.query(Department.id, Department.name).order_by(Department.name)]
+        cache.set('_departments', departments, timeout=3600)
+    return departments
 
 
-def clear_dropdown_cache():
+def clear_department_cache():
+    """Drop the cached department list after creating or deleting a department."""
+    try:
+        from app.extensions import cache
+        cache.delete('_departments')
+    except Exception:
+        pass
+
+
+def clear_dropdown_cache(full=False):
     """
     Clear dropdown-related caches after adding/editing records.
     Uses targeted deletion instead of clearing the entire cache.
+
+    Args:
+        full: also drop memoized status dictionaries and the user map
+              (admin changes to status options)
     """
     try:
         from app.extensions import cache
-        cache.clear()
+        if full:
+            cache.clear()
+        else:
+            cache.delete_many(*_DISTINCT_CACHE_KEYS)
+    except Exception:
+        pass
+
+
+def clear_user_map_cache():
+    """Drop the cached user map after creating, renaming or deleting a user."""
+    try:
+        from app.extensions import cache
+        cache.delete('_user_map')
     except Exception:
         pass
 
 
+# dd.mm.yyyy | yyyy-mm-dd — ті самі форми, що приймав strptime('%d.%m.%Y' / '%Y-%m-%d'),
+# але одним скомпільованим regex без розбору формату й ValueError на кожну спробу
+_DATE_RE = re.compile(r'(?:(\d{1,2})\.(\d{1,2})\.(\d{4})|(\d{4})-(\d{1,2})-(\d{1,2}))')
+
+
 def parse_date(date_str: str, default: Optional[date] = None) -> Optional[date]:
     """
     Parse date string in multiple formats.
@@ -192,22 +319,34 @@ def parse_date(date_str: str, default: Optional[date] = None) -> Optional[date]:
     if not date_str or not date_str.strip():
         return default
 
-    date_str = date_str.strip()
+    m = _DATE_RE.fullmatch(date_str.strip())
+    if m is None:
+        return default
+
+    day, month, year, iso_year, iso_month, iso_day = m.groups()
+    try:
+        if year:
+            return date(int(year), int(month), int(day))  # Ukrainian format: 31.12.2023
+        return date(int(iso_year), int(iso_month), int(iso_day))  # ISO format: 2023-12-31
+    except ValueError:
+        # Formally valid but impossible date, e.g. 31.02.2023
+        return default
+
 
-    # Try multiple date formats
-    formats = (
-        '%d.%m.%Y',  # Ukrainian format: 31.12.2023
-        '%Y-%m-%d',  # ISO format: 2023-12-31
-    )
+@lru_cache(maxsize=32)
+def month_bounds(year: int, month: int) -> tuple:
+    """
+    Return (first day of the month, first day of the next month) as dates.
 
-    for fmt in formats:
-        try:
-            return datetime.strptime(date_str, fmt).date()
-        except ValueError:
-            continue
+    The upper bound is exclusive, ready for `col >= start, col < end` filters.
+    Memoized — the dashboard asks for the same month on almost every request.
 
-    # If no format matched, return default
-    return default
+    Raises:
+        ValueError: if month is not in 1..12 or year is out of range
+    """
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
 
 
 def parse_numeric(value_str: str, default: Optional[float] = None) -> Optional[float]:
@@ -338,7 +477,8 @@ _FALLBACK_DEFAULT_STATUS = {
 
 def get_status_options(scope='ambulatory', include_inactive=False):
     """Довідник статусів (таблиця status_options) як список dict-ів,
-    впорядкований за sort_order. Кешується; інвалідація — clear_dropdown_cache()."""
+    впорядкований за sort_order. Кешується; інвалідація — лише
+    clear_dropdown_cache(full=True) (часткове очищення його не скидає)."""
     from app.extensions import cache
     from models import StatusOption
 
@@ -378,11 +518,101 @@ def get_default_ambulatory_status():
 
 def get_distinct_ambulatory_doctors():
     """Get distinct doctors from database for ambulatory records (cached)."""
-    from app.extensions import cache
-    from models import AmbulatoryRecord, db
-    @cache.memoize(timeout=900)
-    def _inner():
-        return [d[0] for d in db.session.query(AmbulatoryRecord.doctor).distinct()
-                .filter(AmbulatoryRecord.doctor != None)
-                .order_by(AmbulatoryRecord.doctor).all()]
-    return _inner()
+    from models import AmbulatoryRecord
+    return _cached_distinct('_distinct_ambulatory_doctors', AmbulatoryRecord.doctor)
+
+
+def _xlsx_header_format(fill_color: Optional[str]) -> dict:
+    """
+    XlsxWriter format properties for an export header row.
+
+    With a fill colour the text is white bold on that background; without
+    one it is plain bold. Formats belong to a workbook, so the caller turns
+    these properties into a Format with wb.add_format().
+    """
+    props = {'bold': True, 'align': 'center', 'valign': 'vcenter'}
+    if fill_color is not None:
+        props.update(bg_color=f'#{fill_color}', font_color='#FFFFFF')
+    return props
+
+
+def build_xlsx(title: str, headers: list, rows: Iterable, header_color: Optional[str] = None,
+               number_formats: Optional[dict] = None):
+    """
+    Build an XLSX workbook from an iterable of plain row lists with XlsxWriter.
+
+    The workbook runs in constant_memory mode: each row is flushed to a temp
+    file as soon as the next one starts, so with a generator over yield_per()
+    memory stays bounded regardless of the row count. The finished workbook
+    goes to a SpooledTemporaryFile: exports up to 1 MB stay in memory, larger
+    ones spill to disk. Column number formats must exist before rows are
+    written; widths (longest value + 2, capped at 50) are tracked while
+    writing and applied afterwards, since <cols> is only assembled on close().
+    Strings are never turned into hyperlinks. header_color is the header fill
+    (hex RGB, None for plain bold); number_formats maps a 0-based column index
+    to an Excel number format. Returns (workbook, row count); pass the
+    workbook to xlsx_file() to finish it. With no rows the workbook is
+    discarded and (None, 0) is returned.
+    """
+    import xlsxwriter
+
+    f = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+b')
+    wb = xlsxwriter.Workbook(f, {'constant_memory': True, 'strings_to_urls': False})
+    ws = wb.add_worksheet(title)
+
+    formats = {i: wb.add_format({'num_format': fmt}) for i, fmt in (number_formats or {}).items()}
+    for i, fmt in formats.items():
+        ws.set_column(i, i, None, fmt)
+
+    ws.write_row(0, 0, headers, wb.add_format(_xlsx_header_format(header_color)))
+    widths = [len(str(h)) for h in headers]
+    count = 0
+    for count, row in enumerate(rows, 1):
+        ws.write_row(count, 0, row)
+        for i, value in enumerate(row):
+            if value is not None and (n := len(str(value))) > widths[i]:
+                widths[i] = n
+
+    if not count:
+        # close() also removes constant_memory's row temp file
+        wb.close()
+        f.close()
+        return None, 0
+
+    for i, width in enumerate(widths):
+        ws.set_column(i, i, min(width + 2, 50), formats.get(i))
+
+    return wb, count
+
+
+def xlsx_file(wb):
+    """
+    Finish a build_xlsx() workbook and return its file ready for send_file.
+
+    send_file closes (and so deletes) the SpooledTemporaryFile once the
+    response is sent.
+    """
+    wb.close()
+    f = wb.filename
+    f.seek(0)
+    return f
+
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def send_xlsx(f, filename: str):
+    """
+    send_file for an xlsx_file() result, with Content-Length set.
+
+    send_file knows the size only for paths and BytesIO; for the spooled
+    temp file the response would go out chunked and browsers show no
+    download progress. The file itself is passed to the WSGI file_wrapper,
+    so gunicorn can hand a spilled-to-disk export to sendfile().
+    """
+    from flask import send_file
+    size = f.seek(0, 2)
+    f.seek(0)
+    rv = send_file(f, as_attachment=True, download_name=filename, mimetype=XLSX_MIMETYPE)
+    rv.content_length = size
+    return rv